@@ -0,0 +1,9 @@
+'''---------- Batch entry point ----------
+
+Usage: python Batch.py DIR [DIR ...] [--manifest PATH] [--jobs N] [--report PATH] [Final_test.py options]
+'''
+
+from roster.batch import main
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,9 @@
+'''---------- Benchmark entry point ----------
+
+Usage: python Benchmark.py load|series|preferences|symmetry|sweep [--csv PATH]
+'''
+
+from roster.benchmark import main
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,9 @@
+'''---------- Roster service entry point ----------
+
+Usage: python Service.py [--host HOST] [--port PORT] [--processes N] [--max-jobs N]
+'''
+
+from roster.service import main
+
+if __name__ == '__main__':
+    main()
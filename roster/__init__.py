@@ -0,0 +1,25 @@
+'''Duty roster builder for the sailing club race calendar.
+
+The pipeline is split into stages so a model can be built once and reused:
+
+    problem = load_problem('.')
+    result = solve(problem, ModelOptions(double_handed=True))
+'''
+
+from .problem import RosterProblem, freeze_before, load_problem, load_roster
+from .model import ModelOptions, RosterModel, build_model
+from .solver import SolveResult, SolverSettings, solve
+from .decompose import solve_decomposed
+from .alternatives import solve_alternatives
+from .greedy import greedy_roster, greedy_solve
+from .cache import RosterCache
+from .profiling import Profiler
+from .progress import ProgressStream
+
+__all__ = [
+    'RosterProblem', 'freeze_before', 'load_problem', 'load_roster',
+    'ModelOptions', 'RosterModel', 'build_model',
+    'SolveResult', 'SolverSettings', 'solve',
+    'solve_decomposed', 'solve_alternatives', 'greedy_roster', 'greedy_solve',
+    'RosterCache', 'Profiler', 'ProgressStream',
+]
@@ -0,0 +1,150 @@
+'''---------- Alternative rosters ----------
+
+The solution callback only ever sees improving solutions, so a plain solve
+gives one optimal roster. Here the optimum is found first, then further
+rosters with the same objective (or within a tolerance of it) are
+enumerated by cutting off every roster found so far, giving the committee
+several equally good rosters to choose from.
+'''
+
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import replace
+import hashlib
+import multiprocessing
+import os
+
+from ortools.sat.python import cp_model
+
+from .model import ModelOptions, build_model
+from .problem import ROLES
+from .solver import SolverSettings, solve
+
+
+def roster_key(problem, roster):
+    '''Roster as a tuple of (PRO, ARO, safety boat crews) per open event
+
+    The two safety boat seats are interchangeable, so rosters that only swap
+    them have the same key.
+    '''
+    key = []
+    for e in problem.events:
+        if e in problem.frozen:
+            continue
+        roles = roster.get(e, {})
+        key.append((roles.get(ROLES[0]), roles.get(ROLES[1]),
+                    tuple(sorted(s for s in (roles.get(ROLES[2]), roles.get(ROLES[3])) if s is not None))))
+    return tuple(key)
+
+
+def roster_hash(key):
+    '''Short digest of a roster_key, to spot rosters already found'''
+    return hashlib.blake2b(repr(key).encode(), digest_size=8).hexdigest()
+
+
+def roster_distance(key, other):
+    '''Number of duties held in one roster but not the other'''
+    distance = 0
+    for (pro, aro, sb), (other_pro, other_aro, other_sb) in zip(key, other):
+        distance += (pro != other_pro) + (aro != other_aro) + len(set(sb) - set(other_sb))
+    return distance
+
+
+def add_distance_cut(roster_model, problem, roster, distance):
+    '''Require at least distance duties of roster to be given to someone else'''
+    held = []
+    duties = 0
+    for e in problem.events:
+        if e in problem.frozen:
+            continue
+        roles = roster.get(e, {})
+        for role, variables in ((ROLES[0], roster_model.P), (ROLES[1], roster_model.A)):
+            if (roles.get(role), e) in variables:
+                held.append(variables[(roles[role], e)])
+                duties += 1
+        # Either seat keeps a safety boat duty
+        for s in set(roles.get(role) for role in ROLES[2:]) - {None}:
+            held += [variables[(s, e)] for variables in (roster_model.SB_1, roster_model.SB_2)
+                     if (s, e) in variables]
+            duties += 1
+    roster_model.model.Add(sum(held) <= duties - distance)
+
+
+def alternative_roster(job):
+    '''Process pool worker: one roster within bound that is far from all of found
+
+    job is (problem, options, settings, bound, found rosters, distance);
+    returns the SolveResult.
+    '''
+    problem, options, settings, bound, found, distance = job
+    roster_model = build_model(problem, options)
+    roster_model.model.ClearObjective()
+    roster_model.model.Add(roster_model.objective <= bound)
+    for roster in found:
+        add_distance_cut(roster_model, problem, roster, distance)
+    # The latest roster is infeasible now, but repairing it finds a near
+    # optimal neighbour quickly
+    return solve(problem, roster_model=roster_model, settings=settings, verbose=False, hint=found[-1])
+
+
+def solve_alternatives(problem, options=None, count=5, tolerance=0, distance=1, settings=None,
+                       processes=None, verbose=True):
+    '''Up to count distinct rosters within tolerance of the optimum, as SolveResults
+
+    The first result is the optimal solve itself. Each later roster differs
+    from every earlier one in at least distance duties. Every round runs one
+    search per process, each with its own seed; rosters found twice in a
+    round are dropped by hash. Stops early once no further roster exists
+    or a round adds none within the time limit. Unless settings.workers is
+    set, the searches of a round share the cores equally.
+    '''
+    if options is None:
+        options = ModelOptions()
+    # The bound is on the weighted objective, whose optimum is the same
+    options = replace(options, objective='weighted')
+    settings = settings or SolverSettings()
+    cores = os.cpu_count() or 1
+    processes = processes or cores
+    search_settings = settings
+    if settings.workers is None:
+        search_settings = replace(settings, workers=max(1, cores // processes))
+
+    best = solve(problem, options, settings=settings, verbose=False)
+    if not best.has_solution:
+        return [best]
+    bound = int(best.objective) + tolerance
+    results = [best]
+    keys = [roster_key(problem, best.roster)]
+    seen = set(roster_hash(key) for key in keys)
+    if verbose:
+        print('Roster 1: objective %i (%s)' % (best.objective, best.status_name))
+
+    # Spawned rather than forked: the optimal solve has already started
+    # solver threads in this process
+    with ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context('spawn')) as pool:
+        while len(results) < count:
+            found = [result.roster for result in results]
+            seed = settings.seed or 0
+            jobs = [(problem, options, replace(search_settings, seed=seed + len(results) + i), bound, found, distance)
+                    for i in range(min(processes, count - len(results)))]
+            exhausted = True
+            for result in pool.map(alternative_roster, jobs):
+                if result.status == cp_model.INFEASIBLE:
+                    break
+                if not result.has_solution:
+                    continue
+                key = roster_key(problem, result.roster)
+                digest = roster_hash(key)
+                if digest in seen or any(roster_distance(key, other) < distance for other in keys):
+                    continue
+                exhausted = False
+                seen.add(digest)
+                keys.append(key)
+                results.append(result)
+                if verbose:
+                    print('Roster %i: objective %i, %i duties from the nearest earlier roster'
+                          % (len(results), result.objective, min(roster_distance(key, other) for other in keys[:-1])))
+                if len(results) == count:
+                    break
+            if exhausted:
+                break
+    return results
@@ -0,0 +1,133 @@
+'''---------- Batch rostering ----------
+
+Roster many clubs or seasons in one go, each from its own directory of the
+four club csv files. Jobs run in a process pool; each one is a Final_test.py
+run with --data-dir set, whose output goes to roster.log in its directory.
+CP-SAT's search workers are split between the processes so the machine is
+not oversubscribed, and a report with one row per job is written at the end.
+
+    python Batch.py club1 club2 club3 -add3 --time-limit 60
+    python Batch.py --manifest clubs.csv --jobs 4
+'''
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import contextlib
+import os
+import shlex
+import time
+
+import pandas as pd
+
+from . import cli
+from .problem import RACE_CALENDAR, SAILORS
+
+# Per-job log, written in each job's data directory
+JOB_LOG = 'roster.log'
+
+
+def read_manifest(path):
+    '''(directory, flags) pairs from a manifest csv with Directory and optional Flags columns
+
+    Relative directories are taken relative to the manifest.
+    '''
+    manifest = pd.read_csv(path, dtype=str).fillna('')
+    base = os.path.dirname(os.path.abspath(path))
+    flags = manifest['Flags'] if 'Flags' in manifest.columns else [''] * len(manifest)
+    return [(os.path.join(base, directory), shlex.split(extra)) for directory, extra in zip(manifest['Directory'], flags)]
+
+
+def job_size(directory):
+    '''Sailors times events of a job, to start the largest ones first'''
+    sizes = []
+    for name in (SAILORS, RACE_CALENDAR):
+        try:
+            with open(os.path.join(directory, name)) as f:
+                sizes.append(sum(1 for line in f) - 1)
+        except OSError:
+            sizes.append(0)
+    return sizes[0] * sizes[1]
+
+
+def run_job(job):
+    '''Process pool worker: one Final_test.py run; returns a report row'''
+    directory, argv = job
+    row = {'directory': directory, 'status': None, 'error': None}
+    start = time.perf_counter()
+    try:
+        with open(os.path.join(directory, JOB_LOG), 'w') as log, contextlib.redirect_stdout(log), \
+                contextlib.redirect_stderr(log):
+            result = cli.main(argv + ['--data-dir', directory])
+    except SystemExit as error:
+        # argparse reports its errors by exiting
+        row['error'] = 'exited with %s, see %s' % (error.code, JOB_LOG)
+    except Exception as error:
+        row['error'] = '%s: %s' % (type(error).__name__, error)
+    else:
+        row.update({
+            'status': result.status_name,
+            'objective': result.objective,
+            'not_preferred': result.not_preferred,
+            'max_duties': result.max_duties,
+            'min_duties': result.min_duties,
+            'solutions': result.solution_count,
+            'first_solution_time': result.first_solution_time,
+            'solve_seconds': result.wall_time,
+        })
+    row['job_seconds'] = time.perf_counter() - start
+    return row
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(
+        description='Roster several clubs, one data directory each, in a process pool. '
+                    'Any other arguments are Final_test.py options applied to every job.')
+    parser.add_argument('directories', nargs='*', metavar='DIR',
+                        help='data directories holding the four club csv files.')
+    parser.add_argument('--manifest', metavar='PATH',
+                        help='csv with a Directory column and an optional Flags column of extra options per job.')
+    parser.add_argument('--jobs', type=int, metavar='N',
+                        help='jobs run at once (default: one per core, at most the number of jobs).')
+    parser.add_argument('--report', default='batch_report.csv', metavar='PATH',
+                        help='where to write one row per job (default: batch_report.csv).')
+    return parser
+
+
+def main(argv=None):
+    parser = make_parser()
+    args, common = parser.parse_known_args(argv)
+    jobs = [(directory, list(common)) for directory in args.directories]
+    if args.manifest:
+        jobs += [(directory, common + extra) for directory, extra in read_manifest(args.manifest)]
+    if not jobs:
+        parser.error('give data directories or --manifest')
+
+    cores = os.cpu_count() or 1
+    processes = args.jobs or min(cores, len(jobs))
+    # Check every job's options up front, and give jobs without --workers an
+    # equal share of the cores
+    roster_parser = cli.make_parser()
+    for directory, job_argv in jobs:
+        job_args = roster_parser.parse_args(job_argv)
+        cli.settings_from_args(job_args, roster_parser)
+        if job_args.workers is None:
+            job_argv += ['--workers', str(max(1, cores // processes))]
+    jobs.sort(key=lambda job: job_size(job[0]), reverse=True)
+
+    start = time.perf_counter()
+    rows = []
+    with ProcessPoolExecutor(processes) as pool:
+        futures = [pool.submit(run_job, job) for job in jobs]
+        for future in as_completed(futures):
+            row = future.result()
+            rows.append(row)
+            print('%s: %s in %.1f s' % (row['directory'], row['error'] or row['status'], row['job_seconds']))
+
+    report = pd.DataFrame(rows).sort_values('directory')
+    report.to_csv(args.report, index=False)
+    counts = report['status'].fillna('ERROR').value_counts()
+    print('')
+    print('%i jobs in %.1f s with %i processes: %s' % (len(rows), time.perf_counter() - start, processes,
+                                                        ', '.join('%i %s' % (n, status) for status, n in counts.items())))
+    print('Report written to %s' % args.report)
+    return report
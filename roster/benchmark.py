@@ -0,0 +1,214 @@
+'''---------- Benchmarks ----------
+
+Run with `python Benchmark.py <name> [--csv PATH]`; each benchmark prints one line
+per case.
+'''
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, replace
+import multiprocessing
+import random
+import tempfile
+import time
+
+from ortools.sat.python import cp_model
+import pandas as pd
+
+from .generator import InstanceSpec, generate_problem, write_instance
+from .model import ModelOptions, build_model
+from .problem import RosterProblem, load_problem
+from .profiling import peak_rss_mb
+from .solver import SolverSettings, make_solver
+
+
+def evaluation_problem(n=26, m=60, test_percentage=0.18, prefer_ratio=.5, seed=0):
+    '''The Test8_Evaluation instance: n sailors, m weekly events, all PB qualified
+
+    The first n * test_percentage sailors are experienced. Test8 has everyone
+    preferring every duty, which makes the preference term trivially 0, so each
+    preference flag is cleared with probability 1 - prefer_ratio instead (the
+    variant left commented out in Test8).
+    '''
+    rng = random.Random(seed)
+    all_s = list(range(n))
+    all_e = list(range(m))
+    dates = list(pd.date_range('2022-01-02', periods=m, freq='W'))
+    calendar = pd.DataFrame({'Date': all_e, 'Series': 'Evaluation'})
+    return RosterProblem(
+        sailors=all_s,
+        events=all_e,
+        dates=dates,
+        series={'Evaluation': list(range(m))},
+        pb={s: 1 for s in all_s},
+        experienced={s: int(s < n * test_percentage) for s in all_s},
+        prefer_pro={s: int(rng.random() < prefer_ratio) for s in all_s},
+        prefer_aro={s: int(rng.random() < prefer_ratio) for s in all_s},
+        prefer_sb={s: int(rng.random() < prefer_ratio) for s in all_s},
+        unavailable=set(),
+        crew=[],
+        calendar=calendar,
+    )
+
+
+def timed_solve(roster_model, time_limit):
+    '''Solve a built model with a time limit; return (status name, objective, seconds)'''
+    solver, parameters = make_solver(SolverSettings(time_limit=time_limit))
+    status = solver.Solve(roster_model.model)
+    objective = solver.ObjectiveValue() if status in (cp_model.OPTIMAL, cp_model.FEASIBLE) else None
+    return solver.StatusName(status), objective, solver.WallTime()
+
+
+def best_time(function, repeat):
+    '''Smallest wall time of repeat calls to function()'''
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def bench_load(sizes=(1000, 10000, 50000), repeat=3):
+    '''Time load_problem on synthetic Sailors.csv files of increasing size'''
+    rows = []
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            write_instance(directory, InstanceSpec(sailors=n))
+            rows.append({'sailors': n, 'load_seconds': best_time(lambda: load_problem(directory), repeat)})
+    return rows
+
+
+def bench_series(series_counts=(10, 50, 100), num_sailors=100, num_events=150, repeat=3):
+    '''Time build_model with and without -add2 as the number of series grows'''
+    rows = []
+    for n in series_counts:
+        with tempfile.TemporaryDirectory() as directory:
+            write_instance(directory, InstanceSpec(sailors=num_sailors, events=num_events, series=n))
+            problem = load_problem(directory)
+        rows.append({
+            'series': n,
+            'build_seconds': best_time(lambda: build_model(problem, ModelOptions()), repeat),
+            'build_add2_seconds': best_time(lambda: build_model(problem, ModelOptions(one_per_series=True)), repeat),
+        })
+    return rows
+
+
+def bench_preferences(time_limit=30.0, repeat=3):
+    '''Compare the linear and reified -add4 encodings on the Test8_Evaluation instance'''
+    problem = evaluation_problem()
+    rows = []
+    for encoding in ('reified', 'linear'):
+        options = ModelOptions(rest_gap=True, preferences=True, preference_encoding=encoding)
+        roster_model = build_model(problem, options)
+        proto = roster_model.model.Proto()
+        status, objective, solve_seconds = timed_solve(roster_model, time_limit)
+        rows.append({
+            'encoding': encoding,
+            'build_seconds': best_time(lambda: build_model(problem, options), repeat),
+            'variables': len(proto.variables),
+            'constraints': len(proto.constraints),
+            'status': status,
+            'objective': objective,
+            'solve_seconds': solve_seconds,
+        })
+    return rows
+
+
+def bench_symmetry(time_limit=60.0, cases=((26, 60, ''), (26, 60, 'add3'), (13, 30, 'add3'))):
+    '''Time to optimal (or to an infeasibility proof) with and without symmetry breaking
+
+    Cases are (sailors, events, flag) sizes of the Test8_Evaluation instance;
+    13 sailors cannot cover 4 duties over every 4 races, so the last case
+    measures how fast infeasibility is proven.
+    '''
+    rows = []
+    for n, m, flag in cases:
+        problem = evaluation_problem(n=n, m=m, prefer_ratio=1.0)
+        for symmetry_breaking in (False, True):
+            options = ModelOptions(rest_gap=flag == 'add3', symmetry_breaking=symmetry_breaking)
+            status, objective, solve_seconds = timed_solve(build_model(problem, options), time_limit)
+            rows.append({
+                'instance': '%ix%i' % (n, m),
+                'flags': flag or 'none',
+                'symmetry_breaking': symmetry_breaking,
+                'status': status,
+                'objective': objective,
+                'solve_seconds': solve_seconds,
+            })
+    return rows
+
+
+# One factor at a time around InstanceSpec(): dimension -> values tried
+SWEEP = {
+    'sailors': (26, 52, 104),
+    'events': (30, 60, 120),
+    'series': (1, 8, 30),
+    'pb_ratio': (.3, .5, .8),
+    'experienced_ratio': (.2, .5, .8),
+    'prefer_ratio': (.2, .5, .8),
+    'unavailable_rate': (0.0, .05, .2),
+    'crew_rate': (0.0, .2, .5),
+}
+
+
+def sweep_case(job):
+    '''Process pool worker: build and solve one generated instance
+
+    Runs in a fresh process per case, so ru_maxrss is the peak memory of this
+    case alone, solver included.
+    '''
+    spec, options, time_limit = job
+    problem = generate_problem(spec)
+    start = time.perf_counter()
+    roster_model = build_model(problem, options)
+    build_seconds = time.perf_counter() - start
+    proto = roster_model.model.Proto()
+    status, objective, solve_seconds = timed_solve(roster_model, time_limit)
+    return dict(asdict(spec), **{
+        'variables': len(proto.variables),
+        'constraints': len(proto.constraints),
+        'build_seconds': build_seconds,
+        'solve_seconds': solve_seconds,
+        'status': status,
+        'objective': objective,
+        'peak_rss_mb': peak_rss_mb(),
+    })
+
+
+def bench_sweep(sweep=SWEEP, base=None, options=None, time_limit=10.0, seeds=(0,)):
+    '''Build and solve generated instances, varying one InstanceSpec field at a time
+
+    Every value in sweep is tried with the other fields left at base, for
+    each seed. options defaults to the Final_test -add1 -add3 -add4 run.
+    '''
+    base = base or InstanceSpec()
+    options = options or ModelOptions(double_handed=True, rest_gap=True, preferences=True)
+    cases = [(dimension, replace(base, **{dimension: value, 'seed': seed}))
+             for dimension, values in sweep.items() for value in values for seed in seeds]
+    jobs = [(spec, options, time_limit) for dimension, spec in cases]
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn'), max_tasks_per_child=1) as pool:
+        return [dict(dimension=dimension, **row) for (dimension, spec), row in zip(cases, pool.map(sweep_case, jobs))]
+
+
+BENCHMARKS = {
+    'load': bench_load,
+    'series': bench_series,
+    'preferences': bench_preferences,
+    'symmetry': bench_symmetry,
+    'sweep': bench_sweep,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks for the roster pipeline.')
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS))
+    parser.add_argument('--csv', metavar='PATH',
+                        help='also write the rows to PATH, e.g. to track regressions between versions.')
+    args = parser.parse_args(argv)
+    rows = BENCHMARKS[args.benchmark]()
+    for row in rows:
+        print(', '.join('%s: %s' % (key, '%.4f' % value if isinstance(value, float) else value)
+                        for key, value in row.items()))
+    if args.csv:
+        pd.DataFrame(rows).to_csv(args.csv, index=False)
@@ -0,0 +1,191 @@
+'''---------- On-disk model and result cache ----------
+
+Entries are content addressed: the key is a hash of the normalised problem
+and model options, plus the solver settings, hint and solution limit for a
+result. A repeated run returns the cached roster without solving, and a run
+that only changes solver parameters reuses the cached model proto instead
+of building the model again in Python.
+
+    cache = RosterCache('.roster-cache')
+    result = cache.solve(problem, ModelOptions(rest_gap=True))
+'''
+
+from dataclasses import asdict
+import hashlib
+import json
+import os
+
+from google.protobuf import json_format, text_format
+from ortools.sat.python import cp_model
+
+from .model import ModelOptions, RosterModel, build_model, eligible_pairs, objective_terms
+from .output import replace_atomically, write_roster
+from .solver import SolveResult, SolverSettings, solve
+
+# Default cache directory, inside the data directory
+CACHE_DIR = '.roster-cache'
+# Bump whenever build_model changes, so older protos are not reused
+CACHE_VERSION = 1
+
+ROLE_VARIABLES = ('P', 'A', 'SB_1', 'SB_2')
+
+
+def problem_fingerprint(problem):
+    '''Everything in problem that the model depends on, as plain sorted data'''
+    return {
+        'sailors': [[s, problem.pb[s], problem.experienced[s], problem.prefer_pro[s],
+                     problem.prefer_aro[s], problem.prefer_sb[s]] for s in problem.sailors],
+        # dates follow from the event labels
+        'events': list(problem.events),
+        'series': sorted([se, indices] for se, indices in problem.series.items()),
+        'unavailable': sorted(problem.unavailable),
+        'crew': sorted(problem.crew),
+        'frozen': sorted([e, sorted(roles.items())] for e, roles in problem.frozen.items()),
+    }
+
+
+def digest(*parts):
+    '''Hex sha256 of parts in a canonical JSON encoding'''
+    text = json.dumps(parts, sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def model_index(roster_model, problem):
+    '''Proto indices of the variables a RosterModel holds, in eligible_pairs order'''
+    eligible = eligible_pairs(problem)
+    index = {name: [getattr(roster_model, name)[pair].Index() for pair in eligible[name]]
+             for name in ROLE_VARIABLES}
+    index['duty_s'] = [roster_model.duty_s[s].Index() for s in problem.sailors]
+    for name in ('max_val', 'min_val', 'num_not_preferred'):
+        index[name] = getattr(roster_model, name).Index()
+    return index
+
+
+def restore_model(problem, options, model, index):
+    '''The RosterModel of build_model(problem, options), over an already built model'''
+    eligible = eligible_pairs(problem)
+    roles = {}
+    for name in ROLE_VARIABLES:
+        roles[name] = {pair: model.GetBoolVarFromProtoIndex(i) for pair, i in zip(eligible[name], index[name])}
+    D = {}
+    for pair in eligible['D']:
+        D[pair] = cp_model.LinearExpr.Sum([roles[name][pair] for name in ROLE_VARIABLES if pair in roles[name]])
+    max_val, min_val, num_not_preferred = (model.GetIntVarFromProtoIndex(index[name])
+                                           for name in ('max_val', 'min_val', 'num_not_preferred'))
+    objective, objectives = objective_terms(problem, max_val, min_val, num_not_preferred)
+    return RosterModel(
+        model=model,
+        D=D,
+        duty_s={s: model.GetIntVarFromProtoIndex(i) for s, i in zip(problem.sailors, index['duty_s'])},
+        max_val=max_val,
+        min_val=min_val,
+        num_not_preferred=num_not_preferred,
+        options=options,
+        objective=objective,
+        objectives=objectives,
+        **roles
+    )
+
+
+def result_to_json(result):
+    entry = asdict(result)
+    entry['status'] = int(result.status)
+    entry['roster'] = [[e, roles] for e, roles in result.roster.items()]
+    entry['duties'] = [[s, count] for s, count in result.duties.items()]
+    entry['cached'] = False
+    return entry
+
+
+def result_from_json(entry):
+    entry = dict(entry)
+    entry['roster'] = {e: roles for e, roles in entry['roster']}
+    entry['duties'] = {s: count for s, count in entry['duties']}
+    if entry['hinted'] is not None:
+        entry['hinted'] = tuple(entry['hinted'])
+    entry['cached'] = True
+    return SolveResult(**entry)
+
+
+class RosterCache:
+    '''Models and solve results stored under directory by content hash'''
+
+    def __init__(self, directory=CACHE_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key, suffix):
+        return os.path.join(self.directory, key + suffix)
+
+    def model_key(self, problem, options):
+        return digest(CACHE_VERSION, problem_fingerprint(problem), asdict(options))
+
+    def result_key(self, problem, options, settings, hint=None, solution_limit=999):
+        parameters = json_format.MessageToDict(settings.to_proto(), preserving_proto_field_name=True)
+        hint = sorted([e, sorted(roles.items())] for e, roles in hint.items()) if hint is not None else None
+        return digest(self.model_key(problem, options), parameters, hint, solution_limit)
+
+    def model(self, problem, options=None, profiler=None):
+        '''The RosterModel for problem and options, read from the cache if it holds it'''
+        if options is None:
+            options = ModelOptions()
+        key = self.model_key(problem, options)
+        proto_path, index_path = self._path(key, '.model.txt'), self._path(key, '.index.json')
+        if os.path.exists(proto_path) and os.path.exists(index_path):
+            model = cp_model.CpModel()
+            with open(proto_path) as f:
+                text = f.read()
+            if hasattr(model.Proto(), 'parse_text_format'):
+                model.Proto().parse_text_format(text)
+            else:
+                text_format.Parse(text, model.Proto())
+            with open(index_path) as f:
+                index = json.load(f)
+            return restore_model(problem, options, model, index)
+
+        roster_model = build_model(problem, options, profiler)
+        # The index is written last: a model counts as cached once both exist
+        replace_atomically(proto_path, lambda f: f.write(str(roster_model.model.Proto())))
+        replace_atomically(index_path, lambda f: json.dump(model_index(roster_model, problem), f))
+        return roster_model
+
+    def result(self, key):
+        '''The SolveResult stored under key, or None'''
+        path = self._path(key, '.result.json')
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return result_from_json(json.load(f))
+
+    def store(self, key, result):
+        replace_atomically(self._path(key, '.result.json'), lambda f: json.dump(result_to_json(result), f))
+
+    def solve(self, problem, options=None, settings=None, hint=None, solution_limit=999, output_path=None,
+              profiler=None, **kwargs):
+        '''solve() through the cache; other keyword arguments are passed to solve
+
+        Results that found no roster within the time limit are not stored.
+        '''
+        if options is None:
+            options = ModelOptions()
+        settings = settings or SolverSettings()
+        key = self.result_key(problem, options, settings, hint, solution_limit)
+        result = self.result(key)
+        if result is not None:
+            if output_path is not None and result.has_solution:
+                write_roster(problem.calendar, result.roster, output_path)
+            progress = kwargs.get('progress')
+            if progress is not None:
+                progress.start()
+                progress.finish(result.status_name, result.objective, solutions=result.solution_count, cached=True)
+            return result
+
+        if profiler is not None:
+            with profiler.stage('build'):
+                roster_model = self.model(problem, options, profiler)
+        else:
+            roster_model = self.model(problem, options)
+        result = solve(problem, options, roster_model=roster_model, solution_limit=solution_limit,
+                       output_path=output_path, settings=settings, hint=hint, profiler=profiler, **kwargs)
+        if result.status != cp_model.UNKNOWN:
+            self.store(key, result)
+        return result
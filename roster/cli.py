@@ -0,0 +1,287 @@
+'''---------- Add command line arguments ----------'''
+
+import argparse
+import contextlib
+from dataclasses import replace
+import os
+import sys
+
+from ortools.sat.python import cp_model
+
+from .alternatives import solve_alternatives
+from .cache import CACHE_DIR, RosterCache
+from .decompose import solve_decomposed
+from .greedy import greedy_solve
+from .model import OBJECTIVE_TERMS, ModelOptions
+from .problem import RACE_CALENDAR, ROLES, ROSTER, calendar_roster, event_dates, freeze_before, load_problem, load_roster
+from .output import write_roster
+from .profiling import Profiler
+from .progress import ProgressStream
+from .solver import SolverSettings, print_duties, solve
+
+
+def priority_list(text):
+    terms = tuple(term.strip() for term in text.split(','))
+    for term in terms:
+        if term not in OBJECTIVE_TERMS:
+            raise argparse.ArgumentTypeError('unknown objective term %r (choose from %s)'
+                                             % (term, ', '.join(OBJECTIVE_TERMS)))
+    return terms
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(description='A program to solve resource allocation problem.', add_help=False)
+    parser.add_argument('-h', '--help', action='help',
+                        help='All the optional arguments should be separated by spaces.')
+    parser.add_argument('-add1', action='store_true',
+                        help='add the constraint that sailors in double handed boats should be scheduled for duties at the same times.')
+    parser.add_argument('-add2', action='store_true',
+                        help='add the constraint that sailors should only be allocated one duty in each series.')
+    parser.add_argument('-add3', action='store_true',
+                        help='add the constraint that there has to be at least 3 races (or --min-gap) in between duties for each sailor.')
+    parser.add_argument('--min-gap', type=int, metavar='N',
+                        help='number of races required in between duties; implies -add3.')
+    parser.add_argument('--min-days', type=int, default=0, metavar='N',
+                        help='minimum number of days in between duties for each sailor, using the calendar dates.')
+    parser.add_argument('-add4', action='store_true',
+                        help='add the constraint that sailors will be assigned duties according to preference.')
+    parser.add_argument('--symmetry-breaking', action='store_true',
+                        help='order interchangeable sailors and safety boat seats to shrink the search.')
+    parser.add_argument('--objective', choices=('weighted', 'lexicographic'), default='weighted',
+                        help='weighted: one solve of the big-M sum; lexicographic: minimise each term in --priority order.')
+    parser.add_argument('--priority', type=priority_list, default=OBJECTIVE_TERMS, metavar='TERMS',
+                        help='comma separated objective terms for --objective lexicographic (default: spread,preferences).')
+    parser.add_argument('--warm-start', action='store_true',
+                        help='hint the solver with the published roster (--output, Roster.csv by default), '
+                             'or the duties in Race calendar.csv if there is none yet.')
+    parser.add_argument('--hint-from', metavar='PATH',
+                        help='hint the solver with the duties in this roster csv instead; implies --warm-start.')
+    parser.add_argument('--greedy', action='store_true',
+                        help='write a roster built greedily in calendar order, without the solver, for a quick preview.')
+    parser.add_argument('--greedy-hint', action='store_true',
+                        help='hint the solver with the --greedy roster, and keep it if the solver finds none; '
+                             'not with --warm-start or --hint-from.')
+    parser.add_argument('--as-of', metavar='DATE',
+                        help='keep the roster for events before DATE (from --hint-from, else the published roster, '
+                             'else Race calendar.csv) and only re-roster the remaining events.')
+    parser.add_argument('--decompose', action='store_true',
+                        help='solve each series separately in a process pool, balancing duty counts across series.')
+    parser.add_argument('--rounds', type=int, default=3, metavar='N',
+                        help='rebalancing rounds for --decompose (default: 3).')
+    parser.add_argument('--processes', type=int, metavar='N',
+                        help='worker processes for --decompose and --alternatives (default: all cores).')
+    parser.add_argument('--polish', type=float, default=0.0, metavar='SECONDS',
+                        help='after --decompose, improve the merged roster with the full model for SECONDS.')
+    parser.add_argument('--alternatives', type=int, default=1, metavar='K',
+                        help='write up to K distinct optimal rosters, the i-th to Roster-i.csv beside --output.')
+    parser.add_argument('--tolerance', type=int, default=0, metavar='N',
+                        help='let --alternatives exceed the optimal objective value by up to N.')
+    parser.add_argument('--distance', type=int, default=1, metavar='N',
+                        help='duties in which each of the --alternatives must differ from all earlier ones.')
+    parser.add_argument('--data-dir', default='.',
+                        help='directory holding Sailors.csv, Race calendar.csv, Unavailable dates.csv and Crew.csv.')
+    parser.add_argument('--output', metavar='PATH',
+                        help='where to write the rostered calendar (default: Roster.csv in the data directory).')
+    parser.add_argument('--cache', nargs='?', const=CACHE_DIR, metavar='DIR',
+                        help='reuse models and rosters from earlier runs with the same inputs, kept in DIR '
+                             '(default: %s in the data directory).' % CACHE_DIR)
+    parser.add_argument('--profile', metavar='PATH',
+                        help='write wall time, CPU time and peak memory of each stage, and model sizes '
+                             'before and after presolve, to PATH as JSON.')
+    parser.add_argument('--progress', metavar='PATH',
+                        help="stream each solution's objective, bound and gap to PATH as JSON lines; "
+                             "'-' writes them to stdout and the text report to stderr.")
+    parser.add_argument('--checkpoint-interval', type=float, metavar='SECONDS',
+                        help='also write the best roster so far to --output every SECONDS while solving.')
+    parser.add_argument('--workers', type=int, metavar='N',
+                        help='number of CP-SAT search workers (default: all cores).')
+    parser.add_argument('--time-limit', type=float, metavar='SECONDS',
+                        help='stop the search after SECONDS of wall time.')
+    parser.add_argument('--gap', type=float, metavar='FRACTION',
+                        help='accept a roster within this relative gap of the best bound.')
+    parser.add_argument('--seed', type=int,
+                        help='random seed, for reproducible runs.')
+    parser.add_argument('--param', action='append', default=[], metavar='KEY=VALUE',
+                        help='any other CP-SAT SatParameters field; may be repeated.')
+    return parser
+
+
+def options_from_args(args):
+    options = ModelOptions(
+        double_handed=args.add1,
+        one_per_series=args.add2,
+        rest_gap=args.add3,
+        preferences=args.add4,
+        min_days=args.min_days,
+        symmetry_breaking=args.symmetry_breaking,
+        objective=args.objective,
+        priorities=args.priority,
+    )
+    if args.min_gap is not None:
+        options.rest_gap = True
+        options.min_gap = args.min_gap
+    return options
+
+
+def settings_from_args(args, parser):
+    params = {}
+    for item in args.param:
+        key, sep, value = item.partition('=')
+        if not sep:
+            parser.error('--param expects KEY=VALUE, got %r' % item)
+        params[key.strip()] = value.strip()
+    settings = SolverSettings(workers=args.workers, time_limit=args.time_limit,
+                              relative_gap=args.gap, seed=args.seed, params=params)
+    try:
+        settings.to_proto()
+    except ValueError as error:
+        parser.error(str(error))
+    return settings
+
+
+def check_modes(args, parser):
+    '''Reject options that --greedy, --decompose and --alternatives would ignore'''
+    modes = [flag for flag, on in (('--greedy', args.greedy), ('--decompose', args.decompose),
+                                   ('--alternatives', args.alternatives > 1)) if on]
+    if len(modes) > 1:
+        parser.error('%s cannot be combined with %s' % tuple(modes[:2]))
+    if not modes:
+        return
+    ignored = [('--warm-start', args.warm_start), ('--greedy-hint', args.greedy_hint),
+               ('--cache', args.cache), ('--profile', args.profile),
+               ('--checkpoint-interval', args.checkpoint_interval),
+               # with --as-of the roster still decides which events are kept
+               ('--hint-from', args.hint_from and not args.as_of)]
+    if modes[0] == '--greedy':
+        # No model is built, so its options go unused too
+        ignored += [('--objective lexicographic', args.objective == 'lexicographic'),
+                    ('--symmetry-breaking', args.symmetry_breaking)]
+    else:
+        ignored.append(('--progress', args.progress))
+    for flag, value in ignored:
+        if value:
+            parser.error('%s cannot be combined with %s' % (flag, modes[0]))
+    if modes[0] == '--alternatives' and args.objective == 'lexicographic':
+        parser.error('--alternatives needs --objective weighted')
+
+
+def main(argv=None):
+    parser = make_parser()
+    args = parser.parse_args(argv)
+    settings = settings_from_args(args, parser)
+    check_modes(args, parser)
+    progress = ProgressStream.open(args.progress) if args.progress else None
+    # With the progress stream on stdout, the text report goes to stderr
+    report = contextlib.redirect_stdout(sys.stderr) if args.progress == '-' else contextlib.nullcontext()
+    try:
+        with report:
+            return run(args, parser, settings, progress)
+    finally:
+        if progress is not None:
+            progress.close()
+
+
+def run(args, parser, settings, progress):
+    '''Load, solve and report on the problem for parsed command line arguments'''
+    profiler = Profiler()
+    with profiler.stage('load'):
+        problem = load_problem(args.data_dir)
+    if args.min_days:
+        try:
+            event_dates(problem)
+        except ValueError as error:
+            parser.error('--min-days: %s' % error)
+    output_path = args.output or os.path.join(args.data_dir, ROSTER)
+    # The roster already published is the one past events must keep
+    if args.hint_from:
+        prior, source = load_roster(args.hint_from), args.hint_from
+    elif os.path.exists(output_path):
+        prior, source = load_roster(output_path), output_path
+    else:
+        prior, source = calendar_roster(problem.calendar), RACE_CALENDAR
+    hint = prior if args.hint_from or args.warm_start else None
+    if args.as_of:
+        try:
+            problem = freeze_before(problem, prior, args.as_of)
+        except ValueError as error:
+            parser.error('--as-of: %s' % error)
+        print('Keeping the roster from %s for %i of %i events before %s'
+              % (source, len(problem.frozen), len(problem.events), args.as_of))
+    if args.greedy_hint:
+        if hint is not None:
+            parser.error('--greedy-hint cannot be combined with --warm-start or --hint-from')
+        greedy = greedy_solve(problem, options_from_args(args))
+        hint = greedy.roster
+    if args.greedy:
+        result = greedy_solve(problem, options_from_args(args))
+        write_roster(problem.calendar, result.roster, output_path)
+        if progress is not None:
+            progress.start()
+            progress.finish(result.status_name, result.objective, solutions=result.solution_count)
+    elif args.decompose:
+        result = solve_decomposed(problem, options_from_args(args), settings, rounds=args.rounds,
+                                  processes=args.processes, polish_time=args.polish, output_path=output_path)
+    elif args.alternatives > 1:
+        results = solve_alternatives(problem, options_from_args(args), args.alternatives, args.tolerance,
+                                     args.distance, settings, processes=args.processes)
+        stem, ext = os.path.splitext(output_path)
+        for i, alternative in enumerate(results):
+            if alternative.has_solution:
+                write_roster(problem.calendar, alternative.roster, output_path if i == 0 else '%s-%i%s' % (stem, i + 1, ext))
+        result = results[0]
+    elif args.cache:
+        cache = RosterCache(os.path.join(args.data_dir, args.cache))
+        result = cache.solve(problem, options_from_args(args), settings, hint=hint, output_path=output_path,
+                             checkpoint_interval=args.checkpoint_interval,
+                             profiler=profiler if args.profile else None, progress=progress,
+                             verbose=args.progress != '-')
+    else:
+        result = solve(problem, options_from_args(args), output_path=output_path,
+                       checkpoint_interval=args.checkpoint_interval, settings=settings, hint=hint,
+                       profiler=profiler if args.profile else None, progress=progress,
+                       verbose=args.progress != '-')
+    if args.greedy_hint and not result.has_solution and greedy.has_solution:
+        # Fall back on the hint rather than return no roster at all
+        print('The solver found no roster (%s); keeping the greedy roster' % result.status_name)
+        result = replace(greedy, wall_time=result.wall_time, parameters=result.parameters, hinted=result.hinted)
+        write_roster(problem.calendar, result.roster, output_path)
+    if args.profile:
+        profiler.stats['problem'] = {'sailors': len(problem.sailors), 'events': len(problem.events),
+                                     'series': len(problem.series), 'frozen_events': len(problem.frozen)}
+        profiler.stats['result'] = {'status': result.status_name, 'objective': result.objective,
+                                    'cached': result.cached}
+        profiler.write(args.profile)
+
+    print('')
+    print('Solver parameters: %s' % (', '.join('%s=%s' % item for item in result.parameters.items()) or 'defaults'))
+    print('Wall time: %.2f s%s' % (result.wall_time, ' (cached result)' if result.cached else ''))
+    if result.hinted is not None:
+        print('Warm start: %i prior assignments hinted, %i dropped as breaking a constraint' % result.hinted)
+    if result.first_solution_time is not None:
+        print('First solution after %.2f s, best after %.2f s' % (result.first_solution_time, result.best_solution_time))
+
+    if result.status == cp_model.OPTIMAL:
+        print('There is an optimal solution.')
+        print('Optimal objective value: %i' % result.objective)
+        print('Not preferred: %i' % result.not_preferred)
+        print('Max duties: %i' % result.max_duties)
+        print('Min duties: %i' % result.min_duties)
+        print_duties(result.duties)
+    elif result.status == cp_model.FEASIBLE:
+        # Typically the time limit was hit before optimality was proven
+        print('This problem has feasible solutions')
+        print('Best objective value: %i' % result.objective)
+        print('Not preferred: %i' % result.not_preferred)
+        print('Max duties: %i' % result.max_duties)
+        print('Min duties: %i' % result.min_duties)
+        print_duties(result.duties)
+    elif result.status == cp_model.INFEASIBLE:
+        print('This problem has no solutions')
+    elif result.status == cp_model.UNKNOWN and args.greedy:
+        print('The greedy roster leaves %i seats empty; run without --greedy' % sum(
+            len(ROLES) - len(result.roster[e]) for e in problem.events))
+    elif result.status == cp_model.UNKNOWN:
+        print('No solution found within the time limit')
+    else:
+        print('Error')
+    return result
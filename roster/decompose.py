@@ -0,0 +1,245 @@
+'''---------- Per-series decomposition ----------
+
+Each series is solved as its own small model in a process pool, with every
+other event frozen. A master step hands each series a duty quota per sailor
+so that cumulative duty counts come out balanced, and learns from each round
+which quotas a series could not meet.
+
+Series only interact through rest gap windows that span both of them. Series
+are coloured so that no two in one batch share a window, and the batches of
+a round run one after another: whichever of two interacting series is solved
+later sees the other's final roster, so every round's merged roster
+satisfies the full model. The best one is then checked, or polished for a
+short time, with the full model.
+'''
+
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import replace
+import heapq
+import multiprocessing
+import os
+import time
+
+from ortools.sat.python import cp_model
+
+from .model import ModelOptions, build_model, date_windows, frozen_duties, race_windows, roster_stats
+from .problem import event_dates
+from .solver import SolverSettings, make_solver, read_roster, solve
+
+# Weight of one duty away from its quota against one unpreferred duty
+QUOTA_WEIGHT = 1000
+
+
+def series_quotas(problem, options, floor, capacity):
+    '''Duties per (sailor, series) that keep cumulative counts balanced
+
+    Every sailor first gets floor[(s, se)] duties, the number a series has
+    shown it needs from them. The remaining duty slots of each series, in
+    calendar order, then go one at a time to the sailor with the fewest
+    duties so far who still has capacity[(s, se)] left in that series.
+    '''
+    total = {s: 0 for s in problem.sailors}
+    for (s, e) in frozen_duties(problem):
+        if s in total:
+            total[s] += 1
+    quota = {}
+    for (s, se), count in floor.items():
+        quota[(s, se)] = count
+        total[s] += count
+
+    for se, indices in problem.series.items():
+        slots = 4 * sum(problem.events[i] not in problem.frozen for i in indices)
+        slots -= sum(quota.get((s, se), 0) for s in problem.sailors)
+        heap = [(total[s], k, s) for k, s in enumerate(problem.sailors)
+                if quota.get((s, se), 0) < capacity[(s, se)]]
+        heapq.heapify(heap)
+        while slots > 0 and heap:
+            count, k, s = heapq.heappop(heap)
+            quota[(s, se)] = quota.get((s, se), 0) + 1
+            total[s] += 1
+            slots -= 1
+            if quota[(s, se)] < capacity[(s, se)]:
+                heapq.heappush(heap, (total[s], k, s))
+    return quota
+
+
+def series_batches(problem, options):
+    '''Series grouped into batches whose members share no rest gap window'''
+    windows = []
+    if options.rest_gap:
+        windows += race_windows(len(problem.events), options.min_gap)
+    if options.min_days > 0:
+        windows += date_windows(event_dates(problem), options.min_days)
+    series_of = {}
+    for se, indices in problem.series.items():
+        for i in indices:
+            series_of[i] = se
+    conflicts = {se: set() for se in problem.series}
+    for window in windows:
+        names = {series_of[i] for i in window}
+        for se in names:
+            conflicts[se] |= names - {se}
+
+    batches = []
+    for se in problem.series:
+        for batch in batches:
+            if not conflicts[se] & set(batch):
+                batch.append(se)
+                break
+        else:
+            batches.append([se])
+    return batches
+
+
+def roster_score(problem, roster, options):
+    '''(duty spread, unpreferred duties) of a complete roster, for comparing rounds'''
+    duties, not_preferred = roster_stats(problem, roster, options)
+    return max(duties.values()) - min(duties.values()), not_preferred
+
+
+def series_capacity(problem, options):
+    '''Most duties each sailor could take in each series: open dates they are available'''
+    done = frozen_duties(problem)
+    capacity = {}
+    for se, indices in problem.series.items():
+        events = [problem.events[i] for i in indices]
+        for s in problem.sailors:
+            count = sum(e not in problem.frozen and (s, e) not in problem.unavailable for e in events)
+            if options.one_per_series:
+                count = min(count, 0 if any((s, e) in done for e in events) else 1)
+            capacity[(s, se)] = count
+    return capacity
+
+
+def solve_series(job):
+    '''Process pool worker: roster one series towards its quotas
+
+    job is (problem, options, settings, series name, quota, roster); all
+    events outside the series are frozen to roster. Returns the series'
+    part of the roster, or None if no solution was found.
+    '''
+    problem, options, settings, se, quota, roster = job
+    events = set(problem.events[i] for i in problem.series[se])
+    frozen = dict(problem.frozen)
+    for e in problem.events:
+        if e not in events and e not in frozen:
+            frozen[e] = roster.get(e, {})
+    subproblem = replace(problem, frozen=frozen)
+    roster_model = build_model(subproblem, options)
+
+    model = roster_model.model
+    deviations = []
+    for s in problem.sailors:
+        count = sum(roster_model.D[(s, e)] for e in events if (s, e) in roster_model.D)
+        deviation = model.NewIntVar(0, 4 * len(events), 'Quota_deviation_%s' % s)
+        model.AddAbsEquality(deviation, count - quota.get((s, se), 0))
+        deviations.append(deviation)
+    model.Minimize(QUOTA_WEIGHT * sum(deviations) + roster_model.num_not_preferred)
+
+    solver = make_solver(settings)[0]
+    status = solver.Solve(model)
+    if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+        return None
+    series_roster = read_roster(solver.Value, subproblem, roster_model)[0]
+    return {e: series_roster[e] for e in events if e not in problem.frozen}
+
+
+def solve_decomposed(problem, options=None, settings=None, rounds=3, processes=None,
+                     polish_time=0.0, output_path=None, verbose=True):
+    '''Solve problem series by series in a process pool and return a SolveResult
+
+    Each round solves every series in parallel against the quotas from
+    series_quotas, then raises a quota floor where a series needed more
+    duties from a sailor and lowers capacity where it gave fewer, until a
+    round no longer improves (spread, unpreferred duties). The merged
+    roster of the best round is then solved with the full model: fixed as a
+    hint when polish_time is 0 (a feasibility and objective check), or used
+    as a warm start for polish_time seconds. The result is only OPTIMAL if
+    polishing proves it, and its wall time covers the whole decomposition.
+    If a series has no roster in the first round, the full model is solved
+    instead, so infeasible problems are reported as such. settings applies
+    to the series subproblems, with one worker each unless workers is set.
+    '''
+    if options is None:
+        options = ModelOptions()
+    series_settings = replace(settings or SolverSettings())
+    if series_settings.workers is None:
+        series_settings.workers = 1
+    processes = processes or os.cpu_count()
+    start = time.perf_counter()
+
+    capacity = series_capacity(problem, options)
+    batches = series_batches(problem, options)
+    floor = {}
+    roster = dict(problem.frozen)
+    best = None
+    # Spawned rather than forked: the caller may already have started solver threads
+    with ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context('spawn')) as pool:
+        for round_index in range(rounds):
+            # Quotas are redrawn before each batch with the counts the series
+            # solved earlier in this round actually produced
+            solved = {}
+            failed = None
+            for batch in batches:
+                quota = series_quotas(problem, options, {**floor, **solved}, {**capacity, **solved})
+                jobs = [(problem, options, series_settings, se, quota, roster) for se in batch]
+                roster = dict(roster)
+                for se, series_roster in zip(batch, pool.map(solve_series, jobs)):
+                    if series_roster is None:
+                        failed = se
+                        break
+                    roster.update(series_roster)
+                    for s in problem.sailors:
+                        solved[(s, se)] = sum(s in roles.values() for roles in series_roster.values())
+                if failed is not None:
+                    break
+            if failed is not None:
+                if verbose:
+                    print('Round %i: no roster found for series %s' % (round_index + 1, failed))
+                break
+            quota = series_quotas(problem, options, floor, capacity)
+
+            score = roster_score(problem, roster, options)
+            if verbose:
+                print('Round %i: duty spread %i, not preferred %i (%i batches)' % ((round_index + 1,) + score + (len(batches),)))
+            if best is not None and score >= best[0]:
+                break
+            best = (score, roster)
+
+            changed = False
+            for se, indices in problem.series.items():
+                events = [problem.events[i] for i in indices]
+                for s in problem.sailors:
+                    count = sum(s in roster.get(e, {}).values() for e in events)
+                    target = quota.get((s, se), 0)
+                    if count > target and count > floor.get((s, se), 0):
+                        floor[(s, se)] = count
+                        changed = True
+                    elif count < target and count < capacity[(s, se)]:
+                        capacity[(s, se)] = count
+                        changed = True
+            if not changed:
+                break
+
+    if best is None:
+        # No merged roster to start from: let the full model find one, or
+        # prove there is none
+        if verbose:
+            print('Solving the full model instead')
+        result = solve(problem, options, settings=settings, output_path=output_path, verbose=False)
+        result.wall_time = time.perf_counter() - start
+        return result
+
+    final_settings = replace(settings or SolverSettings())
+    if polish_time:
+        final_settings.time_limit = polish_time
+    else:
+        final_settings.params = dict(final_settings.params, fix_variables_to_their_hinted_value='true')
+    result = solve(problem, options, hint=best[1], settings=final_settings, output_path=output_path,
+                   verbose=False)
+    if result.status == cp_model.OPTIMAL and not polish_time:
+        # Optimal only among rosters equal to the fixed hint
+        result.status = cp_model.FEASIBLE
+        result.status_name = 'FEASIBLE'
+    result.wall_time = time.perf_counter() - start
+    return result
@@ -0,0 +1,107 @@
+'''---------- Synthetic instances ----------
+
+A seeded generator for club data of any size, so benchmarks and regression
+runs see exactly the same instance every time:
+
+    problem = generate_problem(InstanceSpec(sailors=52, events=60, seed=1))
+    write_instance('instance', InstanceSpec(sailors=52))
+'''
+
+from dataclasses import dataclass
+import os
+import random
+
+import pandas as pd
+
+from .problem import CREW, RACE_CALENDAR, SAILOR_COLUMNS, SAILORS, UNAVAILABLE_DATES, RosterProblem
+
+
+@dataclass
+class InstanceSpec:
+    '''Size and density of a synthetic instance; ratios and rates are probabilities.'''
+
+    sailors: int = 26
+    # Weekly from start; about 300 at most, before a day-month date comes round on a Sunday again
+    events: int = 60
+    series: int = 8
+    pb_ratio: float = .5
+    experienced_ratio: float = .5
+    # Chance of each of Prefer PRO, Prefer ARO and Prefer SB being set
+    prefer_ratio: float = .5
+    # Chance of each sailor being unavailable on each date
+    unavailable_rate: float = .05
+    # Share of sailors sailing double handed, paired off two at a time
+    crew_rate: float = 0.0
+    start: str = '2022-01-02'
+    seed: int = 0
+
+
+def generate_problem(spec=None):
+    '''A RosterProblem drawn from spec, the same one for the same spec
+
+    Events are weekly from spec.start and split into spec.series series of
+    consecutive races, named and dated as in Race calendar.csv.
+    '''
+    if spec is None:
+        spec = InstanceSpec()
+    rng = random.Random(spec.seed)
+    names = ['Sailor%05i' % i for i in range(spec.sailors)]
+    ratios = (spec.pb_ratio, spec.experienced_ratio, spec.prefer_ratio, spec.prefer_ratio, spec.prefer_ratio)
+    attributes = [{s: int(rng.random() < ratio) for s in names} for ratio in ratios]
+
+    dates = pd.date_range(spec.start, periods=spec.events, freq='W')
+    all_e = list(dates.strftime('%d-%b'))
+    if len(set(all_e)) < len(all_e):
+        raise ValueError('%i weekly events from %s repeat a day-month date; events are named by date, '
+                         'so use fewer' % (spec.events, spec.start))
+    series_names = ['Series %i' % (i * spec.series // spec.events) for i in range(spec.events)]
+    calendar = pd.DataFrame({'Date': all_e, 'Series': series_names, 'Dinghy Start Time': '2.00 pm'})
+    all_series = {}
+    for i, se in enumerate(series_names):
+        all_series.setdefault(se, []).append(i)
+
+    unavailable = set((s, e) for s in names for e in all_e if rng.random() < spec.unavailable_rate)
+
+    double_handed = [s for s in names if rng.random() < spec.crew_rate]
+    rng.shuffle(double_handed)
+    crew = list(zip(double_handed[0::2], double_handed[1::2]))
+
+    return RosterProblem(
+        sailors=names,
+        events=all_e,
+        dates=list(dates),
+        series=all_series,
+        pb=attributes[0],
+        experienced=attributes[1],
+        prefer_pro=attributes[2],
+        prefer_aro=attributes[3],
+        prefer_sb=attributes[4],
+        unavailable=unavailable,
+        crew=crew,
+        calendar=calendar,
+    )
+
+
+def write_instance(directory, spec=None):
+    '''Write the four club csv files for spec into directory; load_problem reads them back'''
+    problem = generate_problem(spec)
+
+    sailors = pd.DataFrame({'Name': problem.sailors})
+    for column, values in zip(SAILOR_COLUMNS, (problem.pb, problem.experienced, problem.prefer_pro,
+                                               problem.prefer_aro, problem.prefer_sb)):
+        sailors[column] = [values[s] for s in problem.sailors]
+    sailors.to_csv(os.path.join(directory, SAILORS), index=False)
+
+    problem.calendar.to_csv(os.path.join(directory, RACE_CALENDAR), index=False)
+
+    unavailable = sorted(problem.unavailable, key=lambda pair: (pair[0], problem.events.index(pair[1])))
+    pd.DataFrame(unavailable, columns=['Name', 'Unavailable']).to_csv(
+        os.path.join(directory, UNAVAILABLE_DATES), index=False)
+
+    # Single handed sailors are listed as helms without crew, as in Crew.csv
+    paired = dict(problem.crew)
+    crewing = set(paired.values())
+    helms = [s for s in problem.sailors if s not in crewing]
+    crew = pd.DataFrame({'HelmName': helms, 'CrewName': [paired.get(s) for s in helms]})
+    crew.to_csv(os.path.join(directory, CREW), index=False)
+    return problem
@@ -0,0 +1,162 @@
+'''---------- Greedy roster ----------
+
+A constructive heuristic that needs no solver: events are filled in
+calendar order, each seat going to the eligible sailor with the fewest
+duties so far. It honours the same hard constraints as the model
+(unavailability, PB and experience, and with the options set crew
+pairing, one duty per series and the rest gap) but may leave a seat empty
+where the model would have backtracked. The roster is good enough for a
+preview and makes a cheap hint for the full solve:
+
+    result = solve(problem, options, hint=greedy_roster(problem, options)[0])
+'''
+
+import time
+
+from ortools.sat.python import cp_model
+
+from .model import ModelOptions, frozen_duties, objective_terms, prefer_by_role, roster_stats
+from .problem import ROLES, event_dates
+from .solver import SolveResult
+
+# Restricted seats first, so PB and experienced sailors are not used up on the others
+FILL_ORDER = (ROLES[0], ROLES[2], ROLES[1], ROLES[3])
+
+
+def greedy_roster(problem, options=None):
+    '''A roster ({event: {role: sailor}}) built greedily, and the number of seats left empty
+
+    Sailors with equal duty counts take turns in the order they reached that
+    count. With options.preferences a sailor preferring the role goes first
+    among those with the fewest duties.
+    '''
+    if options is None:
+        options = ModelOptions()
+    sailors = problem.sailors
+    events = problem.events
+    qualified = {ROLES[0]: problem.experienced, ROLES[2]: problem.pb}
+    prefer = prefer_by_role(problem)
+    partner = {}
+    if options.double_handed:
+        for (helm, crew) in problem.crew:
+            partner[helm] = crew
+            partner[crew] = helm
+    series_of = {i: name for name, indices in problem.series.items() for i in indices}
+    dates = event_dates(problem) if options.min_days > 0 else None
+
+    count = {s: 0 for s in sailors}
+    last = {}
+    served = set()
+    for (s, e) in frozen_duties(problem):
+        # the frozen roster may name sailors who have since left
+        if s in count:
+            count[s] += 1
+    for i, e in enumerate(events):
+        for s in problem.frozen.get(e, {}).values():
+            last[s] = i
+            served.add((s, series_of.get(i)))
+    # buckets[n] holds the sailors with n duties, in the order they got there
+    buckets = []
+    for s in sailors:
+        while len(buckets) <= count[s]:
+            buckets.append({})
+        buckets[count[s]][s] = None
+
+    def rested(s, i):
+        if s not in last:
+            return True
+        if options.rest_gap and i - last[s] <= options.min_gap:
+            return False
+        return options.min_days <= 0 or (dates[i] - dates[last[s]]).days >= options.min_days
+
+    def free(s, i, e, busy):
+        '''s can take some duty at event i: available, rested and not yet on duty'''
+        return (s not in busy and (s, e) not in problem.unavailable and rested(s, i)
+                and not (options.one_per_series and (s, series_of.get(i)) in served))
+
+    def assign(s, i, e, role, roles, busy):
+        roles[role] = s
+        busy.add(s)
+        del buckets[count[s]][s]
+        count[s] += 1
+        if len(buckets) == count[s]:
+            buckets.append({})
+        buckets[count[s]][s] = None
+        last[s] = i
+        served.add((s, series_of.get(i)))
+
+    def qualifies(s, role):
+        return role not in qualified or qualified[role][s]
+
+    def partner_role(s, i, e, role, roles, busy):
+        '''The open role s's crew partner would take alongside s, or None if they cannot'''
+        p = partner[s]
+        if not free(p, i, e, busy):
+            return None
+        for other in FILL_ORDER:
+            if other != role and other not in roles and qualifies(p, other):
+                return other
+        return None
+
+    roster = {}
+    empty = 0
+    for i, e in enumerate(events):
+        if e in problem.frozen:
+            roster[e] = dict(problem.frozen[e])
+            continue
+        roles = {}
+        busy = set()
+        for role in FILL_ORDER:
+            if role in roles:
+                continue
+            choice = None
+            for bucket in buckets:
+                for s in bucket:
+                    if not qualifies(s, role) or not free(s, i, e, busy):
+                        continue
+                    if s in partner and partner_role(s, i, e, role, roles, busy) is None:
+                        continue
+                    if choice is None:
+                        choice = s
+                    if not options.preferences or prefer[role][s]:
+                        choice = s
+                        break
+                if choice is not None:
+                    break
+            if choice is None:
+                empty += 1
+                continue
+            if choice in partner:
+                other = partner_role(choice, i, e, role, roles, busy)
+                assign(choice, i, e, role, roles, busy)
+                assign(partner[choice], i, e, other, roles, busy)
+            else:
+                assign(choice, i, e, role, roles, busy)
+        roster[e] = roles
+    return roster, empty
+
+
+def greedy_solve(problem, options=None):
+    '''The greedy roster as a SolveResult, FEASIBLE if no seat was left empty and UNKNOWN otherwise'''
+    if options is None:
+        options = ModelOptions()
+    start = time.perf_counter()
+    roster, empty = greedy_roster(problem, options)
+    wall_time = time.perf_counter() - start
+    duties, not_preferred = roster_stats(problem, roster, options)
+    max_duties = max(duties.values())
+    min_duties = min(duties.values())
+    objective = objective_terms(problem, max_duties, min_duties, not_preferred)[0]
+    status = cp_model.FEASIBLE if empty == 0 else cp_model.UNKNOWN
+    return SolveResult(
+        status=status,
+        status_name='FEASIBLE' if empty == 0 else 'INCOMPLETE',
+        objective=objective if empty == 0 else None,
+        not_preferred=not_preferred,
+        max_duties=max_duties,
+        min_duties=min_duties,
+        duties=duties,
+        roster=roster,
+        solution_count=int(empty == 0),
+        wall_time=wall_time,
+    )
@@ -0,0 +1,483 @@
+'''---------- Creating model ----------'''
+
+from dataclasses import dataclass
+
+from ortools.sat.python import cp_model
+
+from .problem import ROLES, event_dates
+from .profiling import Profiler
+
+
+# Objective terms, by the names used in ModelOptions.priorities
+OBJECTIVE_TERMS = ('spread', 'preferences')
+
+
+@dataclass
+class ModelOptions:
+    '''Optional constraints, matching the -add1 .. -add4 command line flags.'''
+
+    double_handed: bool = False
+    one_per_series: bool = False
+    rest_gap: bool = False
+    preferences: bool = False
+    # races that must separate two duties of one sailor when rest_gap is set
+    min_gap: int = 3
+    # minimum number of days between two duties of one sailor, 0 to disable
+    min_days: int = 0
+    # 'linear' counts unpreferred duties directly from the role literals,
+    # 'reified' is the original encoding with helper Booleans per (sailor, event)
+    preference_encoding: str = 'linear'
+    # add constraints removing interchangeable sailors and safety boat seats
+    symmetry_breaking: bool = False
+    # 'weighted' minimises the big-M sum of all terms in one solve,
+    # 'lexicographic' minimises the terms one at a time in priorities order
+    objective: str = 'weighted'
+    priorities: tuple = ('spread', 'preferences')
+
+
+@dataclass
+class RosterModel:
+    '''A CpModel together with the variable handles needed to read a roster back.'''
+
+    model: cp_model.CpModel
+    P: dict
+    A: dict
+    SB_1: dict
+    SB_2: dict
+    D: dict  # (sailor, event) -> linear expression P + A + SB_1 + SB_2
+    duty_s: dict
+    max_val: cp_model.IntVar
+    min_val: cp_model.IntVar
+    num_not_preferred: cp_model.IntVar
+    options: ModelOptions = None
+    # weighted objective expression, and each objective term by name
+    objective: cp_model.LinearExpr = None
+    objectives: dict = None
+
+
+def frozen_duties(problem):
+    '''(sailor, event) pairs holding a duty in the frozen part of the roster'''
+    return {(s, e) for e, roles in problem.frozen.items() for s in roles.values()}
+
+
+def eligible_pairs(problem):
+    '''(sailor, event) pairs that may take each role, in sailor-major order
+
+    Sailors are never eligible on their unavailable dates, SB_1 needs a PB
+    qualification and P needs an experienced PRO. 'D' lists every available
+    pair, i.e. those that can hold some duty. Frozen events have no pairs.
+    '''
+    available = [(s, e) for s in problem.sailors for e in problem.events
+                 if (s, e) not in problem.unavailable and e not in problem.frozen]
+    return {
+        'P': [(s, e) for (s, e) in available if problem.experienced[s]],
+        'A': available,
+        'SB_1': [(s, e) for (s, e) in available if problem.pb[s]],
+        'SB_2': available,
+        'D': available,
+    }
+
+
+def race_windows(num_events, min_gap):
+    '''Index windows of min_gap + 1 consecutive races'''
+    size = min(min_gap + 1, num_events)
+    return [list(range(i, i + size)) for i in range(num_events - size + 1)]
+
+
+def date_windows(dates, min_days):
+    '''Maximal index windows of events held less than min_days apart
+
+    dates must be sorted; two pointers give every window in one pass.
+    '''
+    windows = []
+    hi = 0
+    for i in range(len(dates)):
+        last = hi
+        while hi < len(dates) and (dates[hi] - dates[i]).days < min_days:
+            hi += 1
+        if hi - i > 1 and hi > last:
+            windows.append(list(range(i, hi)))
+    return windows
+
+
+def symmetry_classes(problem, options):
+    '''Groups of two or more sailors that no constraint can tell apart
+
+    Sailors are interchangeable when they share PB, experience, preference
+    flags, unavailable dates and frozen duty dates. With -add1 a sailor in a double handed boat
+    is tied to their partner, so those sailors are left out.
+    '''
+    unavailable = {}
+    for (s, e) in problem.unavailable:
+        unavailable.setdefault(s, set()).add(e)
+    done = {}
+    for (s, e) in frozen_duties(problem):
+        done.setdefault(s, set()).add(e)
+    paired = set()
+    if options.double_handed:
+        for (helm, crew) in problem.crew:
+            paired.update((helm, crew))
+
+    classes = {}
+    for s in problem.sailors:
+        if s in paired:
+            continue
+        signature = (problem.pb[s], problem.experienced[s], problem.prefer_pro[s],
+                     problem.prefer_aro[s], problem.prefer_sb[s], frozenset(unavailable.get(s, ())),
+                     frozenset(done.get(s, ())))
+        classes.setdefault(signature, []).append(s)
+    return [sailors for sailors in classes.values() if len(sailors) > 1]
+
+
+def add_lex_greater_equal(model, x, y, name):
+    '''Require the 0/1 sequence x to be lexicographically >= y
+
+    equal[i] is forced true while x and y agree on the first i positions,
+    and wherever it is true x[i] >= y[i] must hold.
+    '''
+    equal = 1
+    for i in range(len(x)):
+        model.Add(x[i] >= y[i] + equal - 1)
+        if i == len(x) - 1:
+            break
+        next_equal = model.NewBoolVar('%s_equal_%i' % (name, i + 1))
+        model.Add(next_equal >= equal + x[i] + y[i] - 2)
+        model.Add(next_equal >= equal - x[i] - y[i])
+        equal = next_equal
+
+
+def objective_terms(problem, max_val, min_val, num_not_preferred):
+    '''The weighted objective, and each objective term by name
+
+    The lexicographic mode re-minimises each term in turn on a copy of the model.
+    '''
+    objectives = {'spread': max_val - min_val, 'preferences': num_not_preferred}
+    objective = len(problem.sailors) * len(problem.events) * 3 * objectives['spread'] + objectives['preferences']
+    return objective, objectives
+
+
+def prefer_by_role(problem):
+    '''Each role's preference flags, {role: {sailor: 0 or 1}}'''
+    return dict(zip(ROLES, (problem.prefer_pro, problem.prefer_aro, problem.prefer_sb, problem.prefer_sb)))
+
+
+def roster_stats(problem, roster, options=None):
+    '''(duties per sailor, unpreferred duties) of a roster, counted as the model counts them
+
+    Frozen duties count towards each sailor's duties but, having no role
+    literals, not towards the unpreferred ones, which are 0 unless
+    options.preferences. Sailors no longer in the problem are skipped.
+    '''
+    if options is None:
+        options = ModelOptions()
+    prefer = prefer_by_role(problem)
+    duties = {s: 0 for s in problem.sailors}
+    not_preferred = 0
+    for e in problem.events:
+        frozen = e in problem.frozen
+        for role, s in (problem.frozen[e] if frozen else roster.get(e, {})).items():
+            if s not in duties:
+                continue
+            duties[s] += 1
+            not_preferred += not frozen and not prefer[role][s]
+    return duties, not_preferred if options.preferences else 0
+
+
+def build_model(problem, options=None, profiler=None):
+    '''Build the CP-SAT model for problem and return it with its variables
+
+    With a Profiler each part of the model is recorded as its own stage.
+    '''
+    if options is None:
+        options = ModelOptions()
+    if profiler is None:
+        profiler = Profiler()
+    if options.preference_encoding not in ('linear', 'reified'):
+        raise ValueError('Unknown preference encoding %r' % options.preference_encoding)
+    if options.objective not in ('weighted', 'lexicographic'):
+        raise ValueError('Unknown objective %r' % options.objective)
+    unknown = set(options.priorities) - set(OBJECTIVE_TERMS)
+    if unknown or not options.priorities:
+        raise ValueError('Priorities must be taken from %s, got %r' % (', '.join(OBJECTIVE_TERMS), options.priorities))
+    all_s = problem.sailors
+    all_e = problem.events
+    # Frozen events keep their roster and get no variables; their duties are constants
+    open_e = [e for e in all_e if e not in problem.frozen]
+    done = frozen_duties(problem)
+
+    model = cp_model.CpModel()
+
+    '''---------- Creating decision variables ----------'''
+
+    # Variables only exist for eligible (sailor, event) pairs; a missing key means 0
+    eligible = eligible_pairs(problem)
+    profiler.lap('eligibility')
+
+    P = {}
+    for (s, e) in eligible['P']:
+        P[(s, e)] = model.NewBoolVar('PRO_%s_%s' % (s, e))
+
+    A = {}
+    for (s, e) in eligible['A']:
+        A[(s, e)] = model.NewBoolVar('ARO_%s_%s' % (s, e))
+
+    SB_1 = {}
+    for (s, e) in eligible['SB_1']:
+        SB_1[(s, e)] = model.NewBoolVar('Safety_boat_1_%s_%s' % (s, e))
+
+    SB_2 = {}
+    for (s, e) in eligible['SB_2']:
+        SB_2[(s, e)] = model.NewBoolVar('Safety_boat_2_%s_%s' % (s, e))
+
+    # number of duties in each race: D = P + A + SB_1 + SB_2 as a linear
+    # expression over the role literals, not a variable of its own
+    duties = {}
+    D = {}
+    for (s, e) in eligible['D']:
+        duties[(s, e)] = [role[(s, e)] for role in (P, A, SB_1, SB_2) if (s, e) in role]
+        D[(s, e)] = cp_model.LinearExpr.Sum(duties[(s, e)])
+    profiler.lap('variables')
+
+    '''---------- Constraints ----------'''
+    # Qualification, experience and unavailability are enforced by which variables exist
+
+    # Only one duty for each event
+    for (s, e) in eligible['D']:
+        model.AddAtMostOne(duties[(s, e)])
+
+    # All duties filled
+    for e in open_e:
+        model.AddExactlyOne(P[(s, e)] for s in all_s if (s, e) in P)
+        model.AddExactlyOne(A[(s, e)] for s in all_s if (s, e) in A)
+        model.AddExactlyOne(SB_1[(s, e)] for s in all_s if (s, e) in SB_1)
+        model.AddExactlyOne(SB_2[(s, e)] for s in all_s if (s, e) in SB_2)
+    profiler.lap('duty constraints')
+
+    # Sailors in double handed boats should be scheduled for duties at the same times
+    if options.double_handed:
+        # One equality per pair and event; a pair where neither sailor is available is skipped
+        for (helm, crew) in problem.crew:
+            for e in open_e:
+                if (helm, e) in D or (crew, e) in D:
+                    model.Add(D.get((helm, e), 0) == D.get((crew, e), 0))
+    profiler.lap('add1 double handed')
+
+    # Sailors should only be allocated one duty in each series
+    if options.one_per_series:
+        for s in all_s:
+            for indices in problem.series.values():
+                series = [all_e[i] for i in indices]
+                past = sum((s, e) in done for e in series)
+                model.Add(sum(D[(s, e)] for e in series if (s, e) in D) <= max(1 - past, 0))
+    profiler.lap('add2 one per series')
+
+    # There has to be at least min_gap races in between duties for each sailor,
+    # and at least min_days days if set. With one duty per event, at most one
+    # duty in a window is the same as at most one of its role literals being true.
+    windows = []
+    if options.rest_gap:
+        windows += race_windows(len(all_e), options.min_gap)
+    if options.min_days > 0:
+        windows += date_windows(event_dates(problem), options.min_days)
+    for s in all_s:
+        for window in windows:
+            literals = [x for i in window for x in duties.get((s, all_e[i]), ())]
+            if any((s, all_e[i]) in done for i in window):
+                # a frozen duty already uses up this window
+                for x in literals:
+                    model.Add(x == 0)
+            elif len(literals) > 1:
+                model.AddAtMostOne(literals)
+    profiler.lap('add3 rest gap')
+
+    # Preferred duties
+    num_not_preferred = model.NewIntVar(0, 4 * len(all_e), 'Number_of_occasions_not_doing_preferred_duties')
+    if options.preferences and options.preference_encoding == 'linear':
+        # Preferences are constants, so a duty is unpreferred exactly when its role
+        # literal is true and the matching flag is 0
+        unpreferred = []
+        for role, prefer in ((P, problem.prefer_pro), (A, problem.prefer_aro),
+                             (SB_1, problem.prefer_sb), (SB_2, problem.prefer_sb)):
+            unpreferred += [var for (s, e), var in role.items() if not prefer[s]]
+        model.Add(num_not_preferred == sum(unpreferred))
+    elif options.preferences and options.preference_encoding == 'reified':
+        not_preferred = {}
+        not_preferred_P = {}
+        not_preferred_A = {}
+        not_preferred_SB = {}
+        for (s, e) in eligible['D']:
+            not_preferred[(s, e)] = model.NewBoolVar('Not_doing_preferred_duties_%s_%s' % (s, e))
+            parts = []
+
+            if (s, e) in P:
+                not_preferred_P[(s, e)] = model.NewBoolVar('Not_doing_preferred_duties_PRO_%s_%s' % (s, e))
+                model.Add(not_preferred_P[(s, e)] == P[(s, e)] - problem.prefer_pro[s]).OnlyEnforceIf(P[(s, e)])
+                model.Add(not_preferred_P[(s, e)] == 0).OnlyEnforceIf(P[(s, e)].Not())
+                parts.append(not_preferred_P[(s, e)])
+
+            not_preferred_A[(s, e)] = model.NewBoolVar('Not_doing_preferred_duties_ARO_%s_%s' % (s, e))
+            model.Add(not_preferred_A[(s, e)] == A[(s, e)] - problem.prefer_aro[s]).OnlyEnforceIf(A[(s, e)])
+            model.Add(not_preferred_A[(s, e)] == 0).OnlyEnforceIf(A[(s, e)].Not())
+            parts.append(not_preferred_A[(s, e)])
+
+            safety_boat = SB_1.get((s, e), 0) + SB_2[(s, e)]
+            not_preferred_SB[(s, e)] = model.NewBoolVar('Not_doing_preferred_duties_Safety_Boat_%s_%s' % (s, e))
+            test = model.NewBoolVar('')
+            model.Add(safety_boat == 1).OnlyEnforceIf(test)
+            model.Add(safety_boat == 0).OnlyEnforceIf(test.Not())
+            model.Add(not_preferred_SB[(s, e)] == safety_boat - problem.prefer_sb[s]).OnlyEnforceIf(test)
+            model.Add(not_preferred_SB[(s, e)] == 0).OnlyEnforceIf(test.Not())
+            parts.append(not_preferred_SB[(s, e)])
+
+            model.Add(not_preferred[(s, e)] == sum(parts))
+        model.Add(num_not_preferred == sum(not_preferred.values()))
+    profiler.lap('add4 preferences')
+
+    '''---------- Find maximum and minimum number of duties allocated ----------'''
+
+    duty_s = {}
+    for s in all_s:
+        duty_s[s] = model.NewIntVar(0, len(all_e), 'Number_of_duties_in_all_series_%s' % s)
+        # duties already done on frozen dates carry into the fairness terms
+        past = sum((s, e) in done for e in problem.frozen)
+        model.Add(duty_s[s] == sum(D[(s, e)] for e in open_e if (s, e) in D) + past)
+
+    max_val = model.NewIntVar(0, len(all_e), 'max_val')
+    model.AddMaxEquality(max_val, [duty_s[s] for s in all_s])
+    min_val = model.NewIntVar(0, len(all_e), 'min_val')
+    model.AddMinEquality(min_val, [duty_s[s] for s in all_s])
+    profiler.lap('duty counts')
+
+    '''---------- Symmetry breaking ----------'''
+
+    if options.symmetry_breaking:
+        # Any permutation of interchangeable sailors' schedules is another solution
+        # with the same objective, so keep only the one whose duty sequences are in
+        # decreasing lexicographic order
+        for sailors in symmetry_classes(problem, options):
+            rows = [[D.get((s, e), int((s, e) in done)) for e in all_e] for s in sailors]
+            for k in range(len(sailors) - 1):
+                add_lex_greater_equal(model, rows[k], rows[k + 1], 'Symmetry_%s_%s' % (sailors[k], sailors[k + 1]))
+
+        # Two PB qualified sailors on safety boat duty can swap seats, so the
+        # earlier one in Sailors.csv always takes SB_1
+        index = {s: i for i, s in enumerate(all_s)}
+        for e in open_e:
+            sb1_index = model.NewIntVar(0, len(all_s), 'Safety_boat_1_index_%s' % e)
+            model.Add(sb1_index == sum(index[s] * SB_1[(s, e)] for s in all_s if (s, e) in SB_1))
+            for s in all_s:
+                if (s, e) in SB_2 and problem.pb[s]:
+                    model.Add(sb1_index < index[s]).OnlyEnforceIf(SB_2[(s, e)])
+    profiler.lap('symmetry breaking')
+
+    '''---------- Objective: minimize (d_max - d_min) ----------'''
+
+    objective, objectives = objective_terms(problem, max_val, min_val, num_not_preferred)
+    model.Minimize(objective)
+    profiler.lap('objective')
+
+    proto = model.Proto()
+    profiler.stats['model'] = {'variables': len(proto.variables), 'constraints': len(proto.constraints)}
+
+    return RosterModel(
+        model=model,
+        P=P,
+        A=A,
+        SB_1=SB_1,
+        SB_2=SB_2,
+        D=D,
+        duty_s=duty_s,
+        max_val=max_val,
+        min_val=min_val,
+        num_not_preferred=num_not_preferred,
+        options=options,
+        objective=objective,
+        objectives=objectives,
+    )
+
+
+def add_hints(roster_model, problem, roster):
+    '''Hint the solver with a prior roster, dropping assignments that no longer fit
+
+    An assignment is kept when the sailor can still take that role on that
+    date and is not already hinted for another duty there, and when it
+    keeps the model's one per series, rest gap and double handed
+    constraints; the other sailors are then hinted off that seat. Seats
+    whose assignment is dropped are left for the solver to fill. When every
+    open seat is kept the duty counts and objective terms are hinted too,
+    so the hint is a complete solution the solver can start from.
+    Returns (kept, dropped).
+    '''
+    model = roster_model.model
+    model.ClearHints()
+    options = roster_model.options or ModelOptions()
+    variables = dict(zip(ROLES, (roster_model.P, roster_model.A, roster_model.SB_1, roster_model.SB_2)))
+    position = {e: i for i, e in enumerate(problem.events)}
+    series_of = {i: se for se, indices in problem.series.items() for i in indices}
+    candidates = []
+    dropped = 0
+    for e in problem.events:
+        if e in problem.frozen:
+            continue
+        busy = set()
+        for role, s in roster.get(e, {}).items():
+            if role not in variables:
+                continue
+            if (s, e) not in variables[role] or s in busy:
+                dropped += 1
+                continue
+            busy.add(s)
+            candidates.append((s, e, role))
+
+    def apart(i, j):
+        '''Two duties at event indices i and j satisfy the rest gap and --min-days'''
+        if options.rest_gap and abs(i - j) <= options.min_gap:
+            return False
+        if options.min_days <= 0:
+            return True
+        dates = event_dates(problem)
+        return abs((dates[i] - dates[j]).days) >= options.min_days
+
+    # Walk the duties in calendar order, each sailor's frozen duties counting from the start
+    held = {}
+    for (s, e) in frozen_duties(problem):
+        held.setdefault(s, []).append(position[e])
+    assignments = []
+    for s, e, role in candidates:
+        i = position[e]
+        earlier = held.get(s, [])
+        if options.one_per_series and any(series_of.get(j) == series_of.get(i) for j in earlier):
+            dropped += 1
+        elif not all(apart(i, j) for j in earlier):
+            dropped += 1
+        else:
+            held.setdefault(s, []).append(i)
+            assignments.append((s, e, role))
+    # Crew partners must both be on duty or both off at each event
+    if options.double_handed:
+        on_duty = set((s, e) for s, e, role in assignments)
+        unpaired = set()
+        for (helm, crew) in problem.crew:
+            for e in problem.events:
+                if ((helm, e) in on_duty) != ((crew, e) in on_duty):
+                    unpaired.update({(helm, e), (crew, e)})
+        dropped += sum((s, e) in unpaired for s, e, role in assignments)
+        assignments = [(s, e, role) for s, e, role in assignments if (s, e) not in unpaired]
+
+    for s, e, role in assignments:
+        for t in problem.sailors:
+            if (t, e) in variables[role]:
+                model.AddHint(variables[role][(t, e)], t == s)
+    kept = len(assignments)
+    roster = {}
+    for s, e, role in assignments:
+        roster.setdefault(e, {})[role] = s
+    open_e = [e for e in problem.events if e not in problem.frozen]
+    if kept == len(ROLES) * len(open_e):
+        duties, not_preferred = roster_stats(problem, roster, options)
+        for s in problem.sailors:
+            model.AddHint(roster_model.duty_s[s], duties[s])
+        model.AddHint(roster_model.max_val, max(duties.values()))
+        model.AddHint(roster_model.min_val, min(duties.values()))
+        model.AddHint(roster_model.num_not_preferred, not_preferred)
+    return kept, dropped
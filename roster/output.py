@@ -0,0 +1,84 @@
+'''---------- Write rosters ----------'''
+
+import os
+import tempfile
+import threading
+
+from .problem import ROLES
+
+
+def roster_frame(calendar, roster):
+    '''Copy of the calendar with the duty columns filled in from roster'''
+    frame = calendar.copy()
+    for role in ROLES:
+        frame[role] = [roster.get(e, {}).get(role) for e in frame['Date']]
+    return frame
+
+
+def replace_atomically(path, write):
+    '''Create path by calling write(f) on a temporary text file that then replaces it
+
+    The temporary file is in the same directory, so readers never see a half
+    written file.
+    '''
+    fd, tmp_path = tempfile.mkstemp(prefix='.roster-', suffix=os.path.splitext(path)[1],
+                                    dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, 'w', newline='') as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp creates the file private to the owner
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def write_roster(calendar, roster, path):
+    '''Write the rostered calendar to path atomically'''
+    frame = roster_frame(calendar, roster)
+    replace_atomically(path, lambda f: frame.to_csv(f, index=False))
+
+
+class CheckpointWriter:
+    '''Write the latest roster to path every interval seconds from a background thread
+
+    If decode is set, update() is handed raw solution values and decode
+    turns them into a roster on the writer thread.
+    '''
+
+    def __init__(self, calendar, path, interval, decode=None):
+        self._calendar = calendar
+        self._path = path
+        self._interval = interval
+        self._decode = decode
+        self._lock = threading.Lock()
+        self._latest = None
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def update(self, roster):
+        '''Hand over a new roster; cheap enough to call from the solution callback'''
+        with self._lock:
+            self._latest = roster
+
+    def flush(self):
+        with self._lock:
+            roster, self._latest = self._latest, None
+        if roster is not None:
+            if self._decode is not None:
+                roster = self._decode(roster)
+            write_roster(self._calendar, roster, self._path)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stopped.wait(self._interval):
+            self.flush()
@@ -0,0 +1,207 @@
+'''---------- Read csv files and input data ----------'''
+
+from dataclasses import dataclass, field, replace
+import os
+
+import pandas as pd
+
+SAILORS = 'Sailors.csv'
+RACE_CALENDAR = 'Race calendar.csv'
+UNAVAILABLE_DATES = 'Unavailable dates.csv'
+CREW = 'Crew.csv'
+# Default output: the calendar with the duty columns filled in
+ROSTER = 'Roster.csv'
+
+# Calendar columns holding the four duties, in the order P, A, SB_1, SB_2
+ROLES = ('Principal Race Officer', 'Assistant Race Officer', 'Safety Boat 1', 'Safety Boat 2')
+
+# Sailors.csv attribute columns (after Name), all 0/1 flags
+SAILOR_COLUMNS = ('PB qualified', 'Experiended PRO', 'Prefer PRO', 'Prefer ARO', 'Prefer SB')
+
+
+@dataclass
+class RosterProblem:
+    '''Input data for one season: sailors, events and their attributes.'''
+
+    sailors: list
+    events: list
+    # event Timestamps, or None until event_dates() first needs them
+    dates: list
+    series: dict
+    pb: dict
+    experienced: dict
+    prefer_pro: dict
+    prefer_aro: dict
+    prefer_sb: dict
+    unavailable: set
+    crew: list
+    calendar: pd.DataFrame
+    # event -> {role: sailor} for past events whose roster must not change
+    frozen: dict = field(default_factory=dict)
+
+
+def read_sailors(path):
+    '''Read Sailors.csv in one pass as an int frame indexed by Name'''
+    dtype = {'Name': str}
+    dtype.update({column: 'int64' for column in SAILOR_COLUMNS})
+    return pd.read_csv(path, usecols=('Name',) + SAILOR_COLUMNS, dtype=dtype, index_col='Name')
+
+
+def read_unavailable(path, all_s, all_e):
+    '''Read Unavailable dates.csv into a set of (sailor, event) pairs
+
+    Rows naming an unknown sailor or a date not in the calendar are dropped.
+    '''
+    df_unavailable_dates = pd.read_csv(path, dtype=str)
+    known = df_unavailable_dates['Name'].isin(all_s) & df_unavailable_dates['Unavailable'].isin(all_e)
+    df_unavailable_dates = df_unavailable_dates[known]
+    return set(zip(df_unavailable_dates['Name'], df_unavailable_dates['Unavailable']))
+
+
+def read_crew(path, all_s):
+    '''Read Crew.csv into a list of (helm, crew) pairs for double handed boats
+
+    Single handed boats (no CrewName) and pairs naming an unknown sailor are dropped.
+    '''
+    df_crew = pd.read_csv(path, dtype=str)
+    # Error checking to make sure each sailor only occurs once in this file
+    checklist = pd.concat([df_crew['HelmName'], df_crew['CrewName'].dropna()])
+    if checklist.duplicated().any():
+        print('Each sailor occurs more than once in Crew.csv file')
+    df_crew = df_crew.dropna(subset=['CrewName'])
+    df_crew = df_crew[df_crew['HelmName'].isin(all_s) & df_crew['CrewName'].isin(all_s)]
+    return list(zip(df_crew['HelmName'], df_crew['CrewName']))
+
+
+def parse_dates(all_e):
+    '''Calendar dates as Timestamps, used for date based rest gaps
+
+    Day-month dates such as '30-Jan' carry no year, so they are placed in a
+    leap year and rolled into the following year whenever the calendar wraps
+    the year end. Raises ValueError for labels that are not dates, and for a
+    calendar that is not in date order.
+    '''
+    try:
+        dates = pd.to_datetime([e + '-2000' for e in all_e], format='%d-%b-%Y')
+    except (TypeError, ValueError):
+        try:
+            dates = list(pd.to_datetime(all_e, dayfirst=True))
+        except (TypeError, ValueError) as error:
+            raise ValueError('Race calendar dates cannot be read as dates: %s' % error)
+        for previous, date, e in zip(dates, dates[1:], all_e[1:]):
+            if date < previous:
+                raise ValueError('Race calendar is not in date order at %s' % e)
+        return dates
+    rolled = []
+    years = 0
+    for date, e in zip(dates, all_e):
+        date = date + pd.DateOffset(years=years)
+        if rolled and date < rolled[-1]:
+            years += 1
+            date = date + pd.DateOffset(years=1)
+            # A year end falls between two races close together; anything
+            # else is a date out of order
+            if (date - rolled[-1]).days > 183:
+                raise ValueError('Race calendar is not in date order at %s' % e)
+        rolled.append(date)
+    return rolled
+
+
+def event_dates(problem):
+    '''problem.dates, parsed from the event labels the first time they are needed
+
+    Only date based options need them, so calendars whose Date column holds
+    plain labels still load.
+    '''
+    if problem.dates is None:
+        problem.dates = parse_dates(problem.events)
+    return problem.dates
+
+
+def load_problem(directory='.'):
+    '''Load the four club csv files from directory into a RosterProblem'''
+    df_sailors = read_sailors(os.path.join(directory, SAILORS))
+    attributes = df_sailors.to_dict()
+    all_s = list(df_sailors.index)
+
+    df_calendar = pd.read_csv(os.path.join(directory, RACE_CALENDAR))
+    # series name -> indices into all_e, in calendar order
+    all_series = {se: indices.tolist() for se, indices in df_calendar.groupby('Series', sort=False).indices.items()}
+    all_e = list(df_calendar['Date'])
+
+    unavailable = read_unavailable(os.path.join(directory, UNAVAILABLE_DATES), all_s, all_e)
+
+    crew = read_crew(os.path.join(directory, CREW), all_s)
+
+    return RosterProblem(
+        sailors=all_s,
+        events=all_e,
+        dates=None,
+        series=all_series,
+        pb=attributes[SAILOR_COLUMNS[0]],
+        experienced=attributes[SAILOR_COLUMNS[1]],
+        prefer_pro=attributes[SAILOR_COLUMNS[2]],
+        prefer_aro=attributes[SAILOR_COLUMNS[3]],
+        prefer_sb=attributes[SAILOR_COLUMNS[4]],
+        unavailable=unavailable,
+        crew=crew,
+        calendar=df_calendar,
+    )
+
+
+def calendar_roster(calendar):
+    '''The roster ({event: {role: sailor}}) recorded in a calendar frame'''
+    roster = {}
+    columns = [role for role in ROLES if role in calendar.columns]
+    for row in calendar[['Date'] + columns].itertuples(index=False):
+        roster[row[0]] = {role: s for role, s in zip(columns, row[1:]) if not pd.isnull(s)}
+    return roster
+
+
+def load_roster(path):
+    '''Read a roster from a calendar style csv (Race calendar.csv or a Roster.csv output)'''
+    return calendar_roster(pd.read_csv(path, dtype=str))
+
+
+def day_month(label):
+    '''label as a Timestamp in 2000 if it is a day-month date such as '30-Jan', else None'''
+    try:
+        return pd.to_datetime(str(label) + '-2000', format='%d-%b-%Y')
+    except ValueError:
+        return None
+
+
+def parse_as_of(problem, as_of):
+    '''as_of (an event date, or any date in the calendar's format) as a Timestamp
+
+    A calendar of day-month dates takes day-month dates only. Those fall in
+    the season's first year, or a later one only if the season runs on past
+    that date there, so a date before the first race freezes nothing.
+    '''
+    dates = event_dates(problem)
+    if as_of in problem.events:
+        return dates[problem.events.index(as_of)]
+    if day_month(problem.events[0]) is None:
+        try:
+            return pd.to_datetime(as_of, dayfirst=True)
+        except ValueError:
+            raise ValueError('%r is not a date' % as_of)
+    date = day_month(as_of)
+    if date is None:
+        raise ValueError('%r is not a day-month date like %s, as in the race calendar' % (as_of, problem.events[0]))
+    date = date + pd.DateOffset(years=dates[0].year - 2000)
+    while date < dates[0] and date + pd.DateOffset(years=1) <= dates[-1]:
+        date = date + pd.DateOffset(years=1)
+    return date
+
+
+def freeze_before(problem, roster, as_of):
+    '''Copy of problem with every event before as_of frozen to its duties in roster
+
+    Raises ValueError if as_of is not a date, or is after every event.
+    '''
+    date = parse_as_of(problem, as_of)
+    frozen = {e: dict(roster.get(e, {})) for e, d in zip(problem.events, event_dates(problem)) if d < date}
+    if problem.events and len(frozen) == len(problem.events):
+        raise ValueError('every event is before %s, so there is nothing left to roster' % as_of)
+    return replace(problem, frozen=frozen)
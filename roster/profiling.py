@@ -0,0 +1,98 @@
+'''---------- Pipeline instrumentation ----------
+
+A Profiler records wall time, CPU time and peak RSS for each stage of a run
+(load, model construction and each constraint family, solve, output)
+together with model statistics, and writes them as a JSON report:
+
+    profiler = Profiler()
+    with profiler.stage('load'):
+        problem = load_problem('.')
+    result = solve(problem, profiler=profiler)
+    profiler.write('profile.json')
+'''
+
+from contextlib import contextmanager
+import json
+import re
+import resource
+import sys
+import time
+
+from .output import replace_atomically
+
+
+def peak_rss_mb():
+    '''Peak resident set size of this process so far, in MB'''
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak / (1024.0 * 1024.0 if sys.platform == 'darwin' else 1024.0)
+
+
+def parse_model_log(message):
+    '''Variable and constraint counts from a CP-SAT 'Initial/Presolved ... model' log message'''
+    counts = {}
+    variables = re.search(r"^#Variables: ([\d']+)", message, re.M)
+    if variables:
+        counts['variables'] = int(variables.group(1).replace("'", ''))
+    constraints = {name: int(count.replace("'", ''))
+                   for name, count in re.findall(r"^#k(\w+): ([\d']+)", message, re.M)}
+    counts['constraints'] = sum(constraints.values())
+    counts['constraint_types'] = constraints
+    return counts
+
+
+class Profiler:
+    '''Wall time, CPU time and peak RSS of the stages of one run, plus model statistics
+
+    stage() times a block; lap() times the code since the previous lap or the
+    start of the enclosing stage, so a long function can be split into
+    stages without reindenting it.
+    '''
+
+    def __init__(self):
+        self.stages = []
+        self.stats = {}
+        self._open = []
+        self._mark = self._sample()
+
+    def _sample(self):
+        return time.perf_counter(), time.process_time(), peak_rss_mb()
+
+    def _record(self, name, start):
+        end = self._sample()
+        self.stages.append({
+            'name': name,
+            'parent': self._open[-1] if self._open else None,
+            'wall_seconds': end[0] - start[0],
+            'cpu_seconds': end[1] - start[1],
+            'peak_rss_mb': end[2],
+            'peak_rss_growth_mb': end[2] - start[2],
+        })
+        self._mark = end
+
+    def lap(self, name):
+        '''Record a stage that ran from the previous lap until now'''
+        self._record(name, self._mark)
+
+    @contextmanager
+    def stage(self, name):
+        start = self._mark = self._sample()
+        self._open.append(name)
+        try:
+            yield self
+        finally:
+            self._open.pop()
+            self._record(name, start)
+
+    def solver_log(self, message):
+        '''CpSolver log_callback: keeps the model sizes before and after presolve'''
+        for prefix, key in (('Initial', 'initial_model'), ('Presolved', 'presolved_model')):
+            if message.startswith(prefix) and ' model' in message.split('\n', 1)[0]:
+                self.stats[key] = parse_model_log(message)
+
+    def report(self):
+        return {'stages': self.stages, 'stats': self.stats}
+
+    def write(self, path):
+        '''Write the report to path as JSON, atomically'''
+        replace_atomically(path, lambda f: json.dump(self.report(), f, indent=2, default=str))
@@ -0,0 +1,101 @@
+'''---------- Solve progress stream ----------
+
+One JSON object per line, for monitoring long solves from a scheduler:
+
+    {"event": "solution", "time": "...", "elapsed": 1.93, "index": 1, "objective": 4680,
+     "bound": 4680, "gap": 0.0, "max_val": 10, "min_val": 9, "num_not_preferred": 0}
+
+'bound' events report a better lower bound between solutions and a final
+'summary' event gives time to the first feasible, best and proven optimal
+roster. In lexicographic mode objective and bound are those of the current
+stage's term.
+'''
+
+from datetime import datetime, timezone
+import json
+import sys
+import threading
+import time
+
+
+def relative_gap(objective, bound):
+    '''Gap between objective and bound as a fraction of the objective'''
+    if objective is None or bound is None:
+        return None
+    return abs(objective - bound) / max(1.0, abs(objective))
+
+
+class ProgressStream:
+    '''Write solve progress events as JSON lines to a file object'''
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        self.objective = None
+        self.bound = None
+        self.solutions = 0
+        self.first_solution = None
+        self.best_solution = None
+
+    @classmethod
+    def open(cls, path):
+        '''A stream writing to path, or to stdout if path is '-' '''
+        return cls(sys.stdout if path == '-' else open(path, 'w'))
+
+    def close(self):
+        if self._stream is not sys.stdout:
+            self._stream.close()
+
+    def _emit(self, event, **fields):
+        elapsed = time.perf_counter() - self._start
+        line = json.dumps(dict({
+            'event': event,
+            'time': datetime.now(timezone.utc).isoformat(timespec='milliseconds'),
+            'elapsed': round(elapsed, 4),
+        }, **fields))
+        with self._lock:
+            self._stream.write(line + '\n')
+            self._stream.flush()
+        return elapsed
+
+    def start(self):
+        '''Mark the start of the search; elapsed times count from here'''
+        self._start = time.perf_counter()
+        self._emit('start')
+
+    def solution(self, index, objective, bound, max_val, min_val, num_not_preferred):
+        self.solutions = index
+        self.objective = objective
+        self.bound = bound
+        elapsed = self._emit('solution', index=index, objective=objective, bound=bound,
+                             gap=relative_gap(objective, bound), max_val=max_val, min_val=min_val,
+                             num_not_preferred=num_not_preferred)
+        if self.first_solution is None:
+            self.first_solution = elapsed
+        self.best_solution = elapsed
+
+    def bound_improved(self, bound):
+        '''CpSolver best_bound_callback'''
+        self.bound = bound
+        self._emit('bound', bound=bound, gap=relative_gap(self.objective, bound))
+
+    def finish(self, status_name, objective=None, bound=None, solutions=None, cached=False):
+        '''Write the summary event and return it as a dict
+
+        A result read back from a cache gives its own solution count and cached=True.
+        '''
+        elapsed = time.perf_counter() - self._start
+        summary = {
+            'status': status_name,
+            'cached': cached,
+            'solutions': self.solutions if solutions is None else solutions,
+            'first_solution_seconds': self.first_solution,
+            'best_solution_seconds': self.best_solution,
+            'optimal_seconds': elapsed if status_name == 'OPTIMAL' and not cached else None,
+            'objective': objective if objective is not None else self.objective,
+            'bound': bound if bound is not None else self.bound,
+        }
+        summary['gap'] = relative_gap(summary['objective'], summary['bound'])
+        self._emit('summary', **summary)
+        return summary
@@ -0,0 +1,538 @@
+'''---------- Local roster service ----------
+
+An HTTP service on localhost that queues solves and runs them in worker
+processes, so requests are answered while rosters are being found:
+
+    POST   /jobs                 submit {"club": ..., "files": {...}, "options": [...]}
+    GET    /jobs                 all jobs
+    GET    /jobs/ID              state and result summary of one job
+    GET    /jobs/ID/events       progress events as JSON lines (?since=N, ?follow=1 to stream)
+    GET    /jobs/ID/roster       the rostered calendar as csv
+    DELETE /jobs/ID              cancel; a running solve keeps its best roster so far
+
+"files" holds the text of the four club csv files by file name and
+"options" is a list of Final_test.py options. Problems are cached per club,
+so later jobs for the same club can leave "files" out. Progress events are
+those of --progress. --greedy jobs return the greedy roster without solving.
+
+    python Service.py --port 8765 --processes 2
+'''
+
+import argparse
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import contextlib
+from dataclasses import replace
+import io
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import traceback
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from . import cli
+from .cache import digest
+from .greedy import greedy_solve
+from .output import roster_frame
+from .problem import (CREW, RACE_CALENDAR, SAILORS, UNAVAILABLE_DATES, calendar_roster, event_dates, freeze_before,
+                      load_problem)
+from .progress import ProgressStream
+from .solver import solve
+
+CLUB_FILES = (SAILORS, RACE_CALENDAR, UNAVAILABLE_DATES, CREW)
+# Options that only make sense for a run on the command line
+UNSUPPORTED_OPTIONS = ('decompose', 'alternatives', 'cache', 'profile', 'progress', 'output',
+                       'checkpoint_interval', 'hint_from', 'data_dir')
+FINISHED = ('done', 'cancelled', 'failed')
+# A job is run at most this many times when worker crashes break the pool
+MAX_ATTEMPTS = 2
+
+
+class RequestError(Exception):
+    '''A bad request, reported to the client with an HTTP status'''
+
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+
+class QueueWriter:
+    '''File-like object putting each line written to it on a queue, tagged with a job id'''
+
+    def __init__(self, queue, job_id):
+        self._queue = queue
+        self._job_id = job_id
+
+    def write(self, text):
+        for line in text.splitlines():
+            self._queue.put((self._job_id, 'event', line))
+
+    def flush(self):
+        pass
+
+
+def parse_options(argv, workers):
+    '''(options, settings, args) from a list of Final_test.py options; raises RequestError'''
+    parser = cli.make_parser()
+    message = io.StringIO()
+    try:
+        with contextlib.redirect_stderr(message), contextlib.redirect_stdout(message):
+            args = parser.parse_args([str(arg) for arg in argv])
+            settings = cli.settings_from_args(args, parser)
+            cli.check_modes(args, parser)
+    except SystemExit:
+        # argparse exits with an error line, or after printing --help
+        lines = message.getvalue().strip().splitlines()
+        error = lines[-1].partition('error: ')[2] if lines else ''
+        raise RequestError(400, error or '--help is not supported by the service; see python Final_test.py --help')
+    defaults = parser.parse_args([])
+    for name in UNSUPPORTED_OPTIONS:
+        if getattr(args, name) != getattr(defaults, name):
+            raise RequestError(400, '--%s is not supported by the service' % name.replace('_', '-'))
+    if settings.workers is None:
+        settings.workers = workers
+    return cli.options_from_args(args), settings, args
+
+
+def read_club_files(files):
+    '''Load a RosterProblem from the csv texts of the four club files'''
+    missing = [name for name in CLUB_FILES if name not in files]
+    if missing:
+        raise RequestError(400, 'missing files: %s' % ', '.join(missing))
+    with tempfile.TemporaryDirectory(prefix='roster-') as directory:
+        for name in CLUB_FILES:
+            with open(os.path.join(directory, name), 'w', newline='') as f:
+                f.write(files[name])
+        try:
+            return load_problem(directory)
+        except Exception as error:
+            raise RequestError(400, 'cannot read the club files: %s: %s' % (type(error).__name__, error))
+
+
+def run_job(job):
+    '''Process pool worker: solve one job, sending its progress and result to the event queue
+
+    greedy is 'preview' for --greedy, whose greedy roster is the result, and
+    'hint' for --greedy-hint, where it is the hint and the fallback if the
+    solver finds no roster.
+    '''
+    job_id, problem, options, settings, hint, greedy, cancel, queue = job
+    # Sent before any work, so a job that crashes its worker is known to have started
+    queue.put((job_id, 'started', None))
+    try:
+        progress = ProgressStream(QueueWriter(queue, job_id))
+        if greedy == 'preview':
+            result = greedy_solve(problem, options)
+            progress.start()
+            progress.finish(result.status_name, result.objective, solutions=result.solution_count)
+        else:
+            if greedy == 'hint':
+                fallback = greedy_solve(problem, options)
+                hint = fallback.roster
+            result = solve(problem, options, settings=settings, hint=hint, verbose=False,
+                           progress=progress, cancel=cancel)
+            if greedy == 'hint' and not result.has_solution and fallback.has_solution:
+                result = replace(fallback, wall_time=result.wall_time, parameters=result.parameters,
+                                 hinted=result.hinted)
+        queue.put((job_id, 'result', result))
+    except Exception as error:
+        queue.put((job_id, 'error', '%s: %s' % (type(error).__name__, error)))
+
+
+class Job:
+    '''One queued, running or finished solve'''
+
+    def __init__(self, club, problem, argv):
+        self.id = uuid.uuid4().hex[:12]
+        self.club = club
+        self.problem = problem
+        self.argv = argv
+        self.state = 'queued'
+        self.events = []
+        self.result = None
+        self.error = None
+        self.cancel = None
+        self.future = None
+        # run_job's argument, kept to resubmit the job if its pool breaks
+        self.work = None
+        self.pool = None
+        self.attempts = 0
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+
+    def summary(self):
+        summary = {
+            'id': self.id,
+            'club': self.club,
+            'state': self.state,
+            'options': self.argv,
+            'submitted': self.submitted,
+            'started': self.started,
+            'finished': self.finished,
+            'events': len(self.events),
+            'error': self.error,
+        }
+        if self.result is not None:
+            result = self.result
+            summary['result'] = {
+                'status': result.status_name,
+                'objective': result.objective,
+                'not_preferred': result.not_preferred,
+                'max_duties': result.max_duties,
+                'min_duties': result.min_duties,
+                'solutions': result.solution_count,
+                'wall_time': result.wall_time,
+                'first_solution_time': result.first_solution_time,
+                'best_solution_time': result.best_solution_time,
+                'duties': result.duties,
+            }
+        return summary
+
+
+class RosterService:
+    '''Job table, problem cache and process pool behind the HTTP handler
+
+    At most max_jobs jobs may be queued or running at once; further
+    submissions are refused until some finish. Each of the processes gets
+    an equal share of the cores for its CP-SAT search workers.
+    '''
+
+    def __init__(self, processes=None, max_jobs=16, max_clubs=32, max_history=100):
+        cores = os.cpu_count() or 1
+        self.processes = processes or cores
+        self.workers = max(1, cores // self.processes)
+        self.max_jobs = max_jobs
+        self.max_clubs = max_clubs
+        self.max_history = max_history
+        self.jobs = OrderedDict()
+        # club -> (digest of its files, RosterProblem), least recently used first
+        self.problems = OrderedDict()
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._manager = multiprocessing.Manager()
+        self._queue = self._manager.Queue()
+        self._pool = self._new_pool()
+        self._drain = threading.Thread(target=self._drain_events, daemon=True)
+        self._drain.start()
+
+    def close(self):
+        for job in list(self.jobs.values()):
+            if job.state not in FINISHED:
+                self.cancel(job.id)
+        self._pool.shutdown(wait=True)
+        self._queue.put(None)
+        self._drain.join()
+        self._manager.shutdown()
+
+    def _new_pool(self):
+        # Spawned rather than forked: the service's threads are not fork safe
+        return ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context('spawn'))
+
+    def _start(self, job):
+        '''Submit job to the pool; called with the lock held'''
+        job.pool = self._pool
+        job.attempts += 1
+        job.future = self._pool.submit(run_job, job.work)
+
+    def problem(self, club, files):
+        '''The club's problem, loaded from files or taken from the cache'''
+        if files is None:
+            with self._lock:
+                if club not in self.problems:
+                    raise RequestError(404, 'no files cached for club %r' % club)
+                self.problems.move_to_end(club)
+                return self.problems[club][1]
+        key = digest(sorted(files.items()))
+        with self._lock:
+            if club in self.problems and self.problems[club][0] == key:
+                self.problems.move_to_end(club)
+                return self.problems[club][1]
+        problem = read_club_files(files)
+        with self._lock:
+            self.problems[club] = (key, problem)
+            self.problems.move_to_end(club)
+            while len(self.problems) > self.max_clubs:
+                self.problems.popitem(last=False)
+        return problem
+
+    def submit(self, request):
+        '''Queue a solve for a decoded POST /jobs body; returns the Job'''
+        club = str(request.get('club', 'default'))
+        files = request.get('files')
+        if files is not None and not (isinstance(files, dict)
+                                      and all(isinstance(text, str) for text in files.values())):
+            raise RequestError(400, '"files" must map file names to csv text')
+        argv = request.get('options', [])
+        if not isinstance(argv, list):
+            raise RequestError(400, '"options" must be a list of command line options')
+        options, settings, args = parse_options(argv, self.workers)
+        problem = self.problem(club, files)
+        if args.min_days:
+            try:
+                event_dates(problem)
+            except ValueError as error:
+                raise RequestError(400, '--min-days: %s' % error)
+        hint = calendar_roster(problem.calendar) if args.warm_start else None
+        if args.greedy_hint and args.warm_start:
+            raise RequestError(400, '--greedy-hint cannot be combined with --warm-start')
+        greedy = 'preview' if args.greedy else 'hint' if args.greedy_hint else None
+        if args.as_of:
+            try:
+                problem = freeze_before(problem, calendar_roster(problem.calendar), args.as_of)
+            except ValueError as error:
+                raise RequestError(400, '--as-of: %s' % error)
+
+        job = Job(club, problem, argv)
+        with self._lock:
+            active = sum(1 for other in self.jobs.values() if other.state not in FINISHED)
+            if active >= self.max_jobs:
+                raise RequestError(503, 'queue full: %i jobs queued or running' % active)
+            job.cancel = self._manager.Event()
+            job.work = (job.id, problem, options, settings, hint, greedy, job.cancel, self._queue)
+            self.jobs[job.id] = job
+            self._forget_old_jobs()
+            self._start(job)
+        job.future.add_done_callback(lambda future: self._job_done(job, future))
+        return job
+
+    def _forget_old_jobs(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.state in FINISHED]
+        for job_id in finished[:max(0, len(finished) - self.max_history)]:
+            del self.jobs[job_id]
+
+    def job(self, job_id):
+        with self._lock:
+            if job_id not in self.jobs:
+                raise RequestError(404, 'no job %r' % job_id)
+            return self.jobs[job_id]
+
+    def cancel(self, job_id):
+        '''Cancel a queued job, or stop a running one at its best roster so far'''
+        job = self.job(job_id)
+        if job.future.cancel():
+            return job
+        with self._lock:
+            if job.state not in FINISHED:
+                job.cancel.set()
+        return job
+
+    def events(self, job, since=0, follow=False):
+        '''Yield the job's progress events from index since; with follow, wait for more until it finishes'''
+        while True:
+            with self._lock:
+                while follow and len(job.events) <= since and job.state not in FINISHED:
+                    self._changed.wait()
+                batch = job.events[since:]
+                finished = job.state in FINISHED
+            for line in batch:
+                yield line
+            since += len(batch)
+            if not follow or (finished and not batch):
+                return
+
+    def _finish(self, job, state, result=None, error=None):
+        # Called with the lock held
+        if job.state in FINISHED:
+            return
+        job.state = state
+        job.result = result
+        job.error = error
+        job.finished = time.time()
+        self._changed.notify_all()
+
+    def _drain_events(self):
+        '''Move events and results from the worker queue onto their jobs'''
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            job_id, kind, value = item
+            with self._lock:
+                job = self.jobs.get(job_id)
+                if job is None:
+                    continue
+                if kind == 'started':
+                    if job.state == 'queued':
+                        job.state = 'running'
+                        job.started = time.time()
+                elif kind == 'event':
+                    job.events.append(value)
+                elif kind == 'result':
+                    self._finish(job, 'cancelled' if job.cancel.is_set() else 'done', result=value)
+                else:
+                    self._finish(job, 'failed', error=value)
+                self._changed.notify_all()
+
+    def _job_done(self, job, future):
+        '''Future callback: handles cancellation before starting and worker crashes
+
+        Results arrive through the event queue. A worker that dies breaks the
+        whole pool, so a new pool is started; jobs that were running fail and
+        jobs that had not started yet are submitted again, up to MAX_ATTEMPTS
+        runs in all. The cap stops a job that crashes its worker before its
+        start reaches the event queue from being resubmitted forever.
+        '''
+        with self._lock:
+            if future.cancelled():
+                self._finish(job, 'cancelled')
+                return
+            error = future.exception()
+            if error is None:
+                return
+            if isinstance(error, BrokenProcessPool):
+                if job.pool is self._pool:
+                    self._pool.shutdown(wait=False)
+                    self._pool = self._new_pool()
+                if job.state == 'queued' and job.attempts < MAX_ATTEMPTS and not job.cancel.is_set():
+                    self._start(job)
+                    resubmitted = job.future
+                    error = None
+            if error is not None:
+                self._finish(job, 'failed', error='%s: %s' % (type(error).__name__, error))
+                return
+        resubmitted.add_done_callback(lambda future: self._job_done(job, future))
+
+
+class RosterHandler(BaseHTTPRequestHandler):
+    '''HTTP front end for the RosterService in server.service'''
+
+    server_version = 'RosterService/1'
+
+    def _send(self, code, body, content_type='application/json'):
+        if content_type == 'application/json':
+            body = json.dumps(body, default=str) + '\n'
+        data = body.encode()
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _route(self):
+        url = urlparse(self.path)
+        parts = [part for part in url.path.split('/') if part]
+        if not parts or parts[0] != 'jobs' or len(parts) > 3:
+            raise RequestError(404, 'no such resource %r' % url.path)
+        return parts[1:], parse_qs(url.query)
+
+    def _handle(self, method):
+        try:
+            method()
+        except RequestError as error:
+            self._send(error.code, {'error': str(error)})
+        except ConnectionError:
+            # The client went away, most likely while following events
+            self.close_connection = True
+        except Exception as error:
+            traceback.print_exc()
+            self._send(500, {'error': '%s: %s' % (type(error).__name__, error)})
+
+    def do_GET(self):
+        self._handle(self._get)
+
+    def do_POST(self):
+        self._handle(self._post)
+
+    def do_DELETE(self):
+        self._handle(self._delete)
+
+    def _get(self):
+        service = self.server.service
+        parts, query = self._route()
+        if not parts:
+            with service._lock:
+                jobs = list(service.jobs.values())
+            self._send(200, [job.summary() for job in jobs])
+            return
+        job = service.job(parts[0])
+        if len(parts) == 1:
+            self._send(200, job.summary())
+        elif parts[1] == 'events':
+            try:
+                since = int(query.get('since', ['0'])[0])
+            except ValueError:
+                raise RequestError(400, 'since must be a whole number')
+            if since < 0:
+                raise RequestError(400, 'since must not be negative')
+            follow = query.get('follow', ['0'])[0] not in ('0', 'false', '')
+            if not follow:
+                self._send(200, ''.join(line + '\n' for line in service.events(job, since)),
+                           'application/x-ndjson')
+                return
+            # No length: the stream ends when the job finishes and the connection closes
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/x-ndjson')
+            self.end_headers()
+            for line in service.events(job, since, follow=True):
+                self.wfile.write((line + '\n').encode())
+                self.wfile.flush()
+            self.close_connection = True
+        elif parts[1] == 'roster':
+            if job.result is None or not job.result.has_solution:
+                raise RequestError(409, 'job %s has no roster (%s)' % (job.id, job.state))
+            frame = roster_frame(job.problem.calendar, job.result.roster)
+            self._send(200, frame.to_csv(index=False), 'text/csv')
+        else:
+            raise RequestError(404, 'no such resource %r' % self.path)
+
+    def _post(self):
+        parts, query = self._route()
+        if parts:
+            raise RequestError(405, 'POST only to /jobs')
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        except ValueError as error:
+            raise RequestError(400, 'body is not JSON: %s' % error)
+        if not isinstance(request, dict):
+            raise RequestError(400, 'body must be a JSON object')
+        job = self.server.service.submit(request)
+        self._send(202, {'id': job.id, 'state': job.state})
+
+    def _delete(self):
+        parts, query = self._route()
+        if len(parts) != 1:
+            raise RequestError(405, 'DELETE only /jobs/ID')
+        job = self.server.service.cancel(parts[0])
+        self._send(202, {'id': job.id, 'state': job.state})
+
+
+def make_server(host='127.0.0.1', port=8765, service=None):
+    '''A threading HTTP server for service (a new RosterService by default)'''
+    server = ThreadingHTTPServer((host, port), RosterHandler)
+    server.daemon_threads = True
+    server.service = service or RosterService()
+    return server
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(description='Serve rostering jobs over HTTP on this machine.')
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='address to listen on (default: 127.0.0.1, this machine only).')
+    parser.add_argument('--port', type=int, default=8765,
+                        help='port to listen on (default: 8765).')
+    parser.add_argument('--processes', type=int, metavar='N',
+                        help='solves run at once, each in its own process (default: one per core).')
+    parser.add_argument('--max-jobs', type=int, default=16, metavar='N',
+                        help='refuse new jobs while N are queued or running (default: 16).')
+    return parser
+
+
+def main(argv=None):
+    args = make_parser().parse_args(argv)
+    server = make_server(args.host, args.port, RosterService(args.processes, args.max_jobs))
+    print('Serving rosters on http://%s:%i/jobs with %i processes' % (args.host, server.server_address[1],
+                                                                      server.service.processes))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.service.close()
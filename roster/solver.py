@@ -0,0 +1,391 @@
+'''---------- Launch a solver ----------'''
+
+from dataclasses import dataclass, field, replace
+import threading
+import time
+
+from google.protobuf import json_format, text_format
+import numpy as np
+from ortools.sat import sat_parameters_pb2
+from ortools.sat.python import cp_model
+
+from .model import add_hints, build_model
+from .output import CheckpointWriter, write_roster
+from .problem import ROLES
+from .profiling import Profiler
+
+
+@dataclass
+class SolverSettings:
+    '''CP-SAT parameters for a solve; None leaves the solver default.
+
+    params is passed through to SatParameters as field name -> value,
+    e.g. {'log_search_progress': 'true', 'linearization_level': 2}.
+    '''
+
+    workers: int = None
+    time_limit: float = None
+    relative_gap: float = None
+    seed: int = None
+    params: dict = field(default_factory=dict)
+
+    def to_proto(self):
+        '''The settings as a SatParameters message holding only the fields that are set'''
+        parameters = sat_parameters_pb2.SatParameters()
+        for name, value in (('num_workers', self.workers), ('max_time_in_seconds', self.time_limit),
+                            ('relative_gap_limit', self.relative_gap), ('random_seed', self.seed)):
+            if value is not None:
+                setattr(parameters, name, value)
+        for name, value in self.params.items():
+            try:
+                text_format.Merge('%s: %s' % (name, value), parameters)
+            except text_format.ParseError as error:
+                raise ValueError('Invalid solver parameter %s=%s: %s' % (name, value, error))
+        return parameters
+
+
+def make_solver(settings=None, log_callback=None):
+    '''A CpSolver configured from settings, and the effective parameters as a dict
+
+    log_callback, if given, receives the search log instead of stdout
+    (unless settings already ask for log_search_progress themselves).
+    '''
+    settings = settings or SolverSettings()
+    if log_callback is not None and 'log_search_progress' not in settings.params:
+        settings = replace(settings, params=dict(settings.params, log_search_progress='true', log_to_stdout='false'))
+    parameters = settings.to_proto()
+    solver = cp_model.CpSolver()
+    if log_callback is not None:
+        solver.log_callback = log_callback
+    text = text_format.MessageToString(parameters)
+    if hasattr(solver.parameters, 'merge_text_format'):
+        solver.parameters.merge_text_format(text)
+    else:
+        solver.parameters.MergeFrom(parameters)
+    return solver, json_format.MessageToDict(parameters, preserving_proto_field_name=True)
+
+
+@dataclass
+class SolveResult:
+    '''Outcome of a solve: status, objective terms and the roster itself.'''
+
+    status: int
+    status_name: str
+    objective: float = None
+    not_preferred: int = None
+    max_duties: int = None
+    min_duties: int = None
+    duties: dict = field(default_factory=dict)
+    roster: dict = field(default_factory=dict)
+    solution_count: int = 0
+    wall_time: float = 0.0
+    parameters: dict = field(default_factory=dict)
+    # (kept, dropped) assignments of the hint roster, if one was given
+    hinted: tuple = None
+    # True when the result was read back from a RosterCache
+    cached: bool = False
+    # seconds from the start of the search to the first and to the last solution
+    first_solution_time: float = None
+    best_solution_time: float = None
+
+    @property
+    def has_solution(self):
+        return self.status in (cp_model.OPTIMAL, cp_model.FEASIBLE)
+
+
+def read_roster(value, problem, roster_model):
+    '''Read the roster ({event: {role: sailor}}) and duty counts using value()'''
+    roster = {e: dict(problem.frozen.get(e, {})) for e in problem.events}
+    for role, variables in zip(ROLES, (roster_model.P, roster_model.A, roster_model.SB_1, roster_model.SB_2)):
+        for (s, e), var in variables.items():
+            if value(var):
+                roster[e][role] = s
+    duties = {}
+    for s in problem.sailors:
+        duties[s] = value(roster_model.duty_s[s])
+    return roster, duties
+
+
+def print_duties(duties):
+    '''Print average duties and each sailor's duties, busiest first'''
+    aver = sum(duties.values()) / len(duties)
+    print('Weighted average duties: %f' % aver)
+    for s in sorted(duties, key=duties.get, reverse=True):
+        print('Sailor: %s Duties: %i' % (s, duties[s]))
+
+
+class SolutionDecoder:
+    '''Read every role literal and duty count of a solution in one pass
+
+    The model's variable indices are gathered once, so a solution is taken
+    from the response as one array and indexed with numpy rather than with
+    a Value() call per variable. Turning the array into a roster is left
+    to roster(), to be called after the search or from another thread.
+    '''
+
+    def __init__(self, problem, roster_model):
+        self._problem = problem
+        self._keys = []
+        variables = []
+        for role, role_variables in zip(ROLES, (roster_model.P, roster_model.A, roster_model.SB_1, roster_model.SB_2)):
+            for (s, e), var in role_variables.items():
+                self._keys.append((e, role, s))
+                variables.append(var)
+        variables += [roster_model.duty_s[s] for s in problem.sailors]
+        self._index = np.array([var.Index() for var in variables], dtype=np.int64)
+
+    def values(self, solution):
+        '''Compact array of the role literals then duty counts, from a response's solution field'''
+        return np.fromiter(solution, dtype=np.int64, count=len(solution))[self._index]
+
+    def duties(self, values):
+        return dict(zip(self._problem.sailors, values[len(self._keys):].tolist()))
+
+    def roster(self, values):
+        '''The roster ({event: {role: sailor}}) held in values'''
+        roster = {e: dict(self._problem.frozen.get(e, {})) for e in self._problem.events}
+        for k in np.flatnonzero(values[:len(self._keys)]):
+            e, role, s = self._keys[k]
+            roster[e][role] = s
+        return roster
+
+
+'''---------- Register a callback ----------'''
+
+class SolutionPrinter(cp_model.CpSolverSolutionCallback):
+    '''Print intermediate solutions'''
+
+    def __init__(self, problem, roster_model, limit, checkpoint=None, verbose=True, decoder=None, progress=None):
+        cp_model.CpSolverSolutionCallback.__init__(self)
+        self._problem = problem
+        self._roster_model = roster_model
+        self._decoder = decoder or SolutionDecoder(problem, roster_model)
+        self._checkpoint = checkpoint
+        self._verbose = verbose
+        self._progress = progress
+        self._solution_count = 0
+        self._solution_limit = limit
+        self._start = time.perf_counter()
+        self.best_values = None
+        # time spent inside on_solution_callback, while the search waits
+        self.callback_seconds = 0.0
+        self.first_solution_time = None
+        self.best_solution_time = None
+        self.stopped = False
+
+    def stop(self):
+        '''Stop the search from any thread, including later lexicographic stages'''
+        self.stopped = True
+        self.StopSearch()
+
+    def attach(self, solver):
+        '''Report solver's bound improvements to the progress stream, if any'''
+        if self._progress is not None:
+            solver.best_bound_callback = self._progress.bound_improved
+
+    @property
+    def best_roster(self):
+        '''The latest roster found, decoded on demand'''
+        if self.best_values is None:
+            return None
+        return self._decoder.roster(self.best_values)
+
+    def on_solution_callback(self):
+        start = time.perf_counter()
+        self._solution_count += 1
+        if self.first_solution_time is None:
+            self.first_solution_time = start - self._start
+        self.best_solution_time = start - self._start
+        # Solutions only ever improve, so the latest one is the best so far.
+        # Only the raw values are kept here; the checkpoint thread decodes
+        # and writes them.
+        values = self._decoder.values(self.Response().solution)
+        self.best_values = values
+        if self._checkpoint is not None:
+            self._checkpoint.update(values)
+        if self._progress is not None:
+            self._progress.solution(self._solution_count, int(self.ObjectiveValue()), self.BestObjectiveBound(),
+                                    self.Value(self._roster_model.max_val), self.Value(self._roster_model.min_val),
+                                    self.Value(self._roster_model.num_not_preferred))
+
+        if self._verbose:
+            print('')
+            print('Solution %i' % self._solution_count)
+            print('Objective value: %i' % self.ObjectiveValue())
+            print('Not preferred: %i' % self.Value(self._roster_model.num_not_preferred))
+            print('Max duties: %i' % self.Value(self._roster_model.max_val))
+            print('Min duties: %i' % self.Value(self._roster_model.min_val))
+            print_duties(self._decoder.duties(values))
+            print('There are %i solutions.' % self._solution_count)
+
+
+        if self._solution_count >= self._solution_limit:
+            if self._verbose:
+                print('  Stop search after %i solutions' % self._solution_limit)
+            self.StopSearch()
+        self.callback_seconds += time.perf_counter() - start
+
+    def solution_count(self):
+        return self._solution_count
+
+
+def solve(problem, options=None, roster_model=None, solution_limit=999, output_path=None,
+          checkpoint_interval=None, verbose=True, settings=None, hint=None, profiler=None, progress=None,
+          cancel=None):
+    '''Solve problem and return a SolveResult.
+
+    A prebuilt roster_model can be passed in to skip model construction and
+    settings (SolverSettings) tunes CP-SAT; the parameters actually applied
+    are recorded in SolveResult.parameters.
+    If output_path is given the final roster is written there once, atomically;
+    with checkpoint_interval (seconds) the best roster so far is also flushed
+    there from a background thread while the search runs.
+    A prior roster ({event: {role: sailor}}) given as hint warm starts the
+    search; assignments that have become infeasible are dropped.
+    A Profiler records the build, search and output stages, the solver's
+    model sizes before and after presolve, and the time spent in callbacks.
+    A ProgressStream given as progress receives every solution and bound
+    improvement, and a closing summary.
+    Setting cancel (a threading or multiprocessing Event) stops the search
+    early; the best roster found so far is returned as usual.
+    '''
+    # The search log is only captured when profiling was asked for
+    log_callback = profiler.solver_log if profiler is not None else None
+    if profiler is None:
+        profiler = Profiler()
+    if roster_model is None:
+        with profiler.stage('build'):
+            roster_model = build_model(problem, options, profiler)
+    hinted = None
+    if hint is not None:
+        with profiler.stage('hints'):
+            hinted = add_hints(roster_model, problem, hint)
+
+    decoder = SolutionDecoder(problem, roster_model)
+    checkpoint = None
+    if output_path is not None and checkpoint_interval:
+        checkpoint = CheckpointWriter(problem.calendar, output_path, checkpoint_interval, decoder.roster)
+        checkpoint.start()
+
+    solution_printer = SolutionPrinter(problem, roster_model, solution_limit, checkpoint, verbose, decoder, progress)
+    if progress is not None:
+        progress.start()
+    finished = threading.Event()
+    if cancel is not None:
+        threading.Thread(target=watch_cancel, args=(cancel, finished, solution_printer), daemon=True).start()
+    try:
+        with profiler.stage('solve'):
+            if roster_model.options.objective == 'lexicographic':
+                solver, status, parameters, wall_time = solve_lexicographic(roster_model, settings, solution_printer,
+                                                                            log_callback)
+            else:
+                solver, parameters = make_solver(settings, log_callback)
+                solution_printer.attach(solver)
+                status = solver.Solve(roster_model.model, solution_printer)
+                wall_time = solver.WallTime()
+    finally:
+        finished.set()
+        if checkpoint is not None:
+            checkpoint.stop()
+    profiler.stats['solve'] = {
+        'status': solver.StatusName(status),
+        'wall_time': wall_time,
+        'solutions': solution_printer.solution_count(),
+        'callback_seconds': solution_printer.callback_seconds,
+    }
+
+    result = SolveResult(
+        status=status,
+        status_name=solver.StatusName(status),
+        solution_count=solution_printer.solution_count(),
+        wall_time=wall_time,
+        parameters=parameters,
+        hinted=hinted,
+        first_solution_time=solution_printer.first_solution_time,
+        best_solution_time=solution_printer.best_solution_time,
+    )
+    if result.has_solution:
+        result.objective = solver.Value(roster_model.objective)
+        result.not_preferred = solver.Value(roster_model.num_not_preferred)
+        result.max_duties = solver.Value(roster_model.max_val)
+        result.min_duties = solver.Value(roster_model.min_val)
+        result.roster, result.duties = read_roster(solver.Value, problem, roster_model)
+        if output_path is not None:
+            with profiler.stage('output'):
+                write_roster(problem.calendar, result.roster, output_path)
+    if progress is not None:
+        if roster_model.options.objective == 'lexicographic' and result.has_solution:
+            # The stream follows the stage term, as its solution events do
+            progress.finish(result.status_name, solver.ObjectiveValue(), solver.BestObjectiveBound())
+        else:
+            progress.finish(result.status_name, result.objective)
+    return result
+
+
+def watch_cancel(cancel, finished, solution_printer, interval=0.1):
+    '''Stop solution_printer's search once cancel is set, until finished is set'''
+    while not finished.is_set():
+        if cancel.wait(interval):
+            solution_printer.stop()
+            return
+
+
+def role_literals(roster_model):
+    '''Every role variable of the model, in a fixed order'''
+    return [var for role in (roster_model.P, roster_model.A, roster_model.SB_1, roster_model.SB_2)
+            for var in role.values()]
+
+
+def solve_lexicographic(roster_model, settings, solution_printer, log_callback=None):
+    '''Minimise each objective term in priority order on a copy of the model
+
+    After each stage the term is fixed at its optimum (or capped at the best
+    value found if the stage ran out of time) and the stage's roster is
+    passed to the next stage as a hint. A time limit covers all stages.
+    Returns the last solver, the overall status, parameters and wall time;
+    the status is UNKNOWN if no stage ran.
+    '''
+    settings = settings or SolverSettings()
+    parameters = json_format.MessageToDict(settings.to_proto(), preserving_proto_field_name=True)
+    model = roster_model.model.Clone()
+    literals = role_literals(roster_model)
+    overall = cp_model.OPTIMAL
+    best = None
+    wall_time = 0.0
+    for name in roster_model.options.priorities:
+        if solution_printer.stopped:
+            overall = cp_model.FEASIBLE
+            break
+        term = roster_model.objectives[name]
+        model.Minimize(term)
+        stage_settings = replace(settings)
+        if settings.time_limit is not None:
+            stage_settings.time_limit = settings.time_limit - wall_time
+            if stage_settings.time_limit <= 0:
+                overall = cp_model.FEASIBLE
+                break
+        solver = make_solver(stage_settings, log_callback)[0]
+        solution_printer.attach(solver)
+        status = solver.Solve(model, solution_printer)
+        wall_time += solver.WallTime()
+        if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+            if best is None:
+                return solver, status, parameters, wall_time
+            # Out of time in a later stage: keep the previous stage's roster
+            overall = cp_model.FEASIBLE
+            break
+        best = solver
+
+        value = int(solver.Value(term))
+        if status == cp_model.OPTIMAL:
+            model.Add(term == value)
+        else:
+            overall = cp_model.FEASIBLE
+            model.Add(term <= value)
+        model.ClearHints()
+        for var in literals:
+            model.AddHint(var, solver.BooleanValue(var))
+    if best is None:
+        # Stopped or out of time before the first stage ran
+        return cp_model.CpSolver(), cp_model.UNKNOWN, parameters, wall_time
+    return best, overall, parameters, wall_time
@@ -0,0 +1,171 @@
+'''---------- Roster package tests ----------
+
+Small generated instances, so the whole module runs in well under a minute:
+
+    python -m pytest -q
+'''
+
+from dataclasses import replace
+import os
+import signal
+import time
+
+import pytest
+from ortools.sat.python import cp_model
+
+from roster import (ModelOptions, RosterCache, SolverSettings, freeze_before, greedy_roster, solve,
+                    solve_decomposed)
+from roster.generator import InstanceSpec, generate_problem, write_instance
+from roster.problem import CREW, RACE_CALENDAR, ROLES, SAILORS, UNAVAILABLE_DATES
+from roster.service import FINISHED, RequestError, RosterService
+
+SPEC = InstanceSpec(sailors=30, events=10, series=2, seed=3)
+OPTIONS = ModelOptions(one_per_series=True, preferences=True)
+SETTINGS = SolverSettings(workers=1, time_limit=20, seed=0)
+
+
+'''---------- Helpers ----------'''
+
+
+def check_roster(problem, roster, options=OPTIONS):
+    '''Assert roster fills every seat and keeps the hard constraints of options'''
+    qualified = {ROLES[0]: problem.experienced, ROLES[2]: problem.pb}
+    series_of = {i: se for se, indices in problem.series.items() for i in indices}
+    served = set()
+    for i, e in enumerate(problem.events):
+        roles = roster[e]
+        if e in problem.frozen:
+            assert roles == problem.frozen[e]
+            continue
+        assert sorted(roles) == sorted(ROLES)
+        assert len(set(roles.values())) == len(ROLES)
+        for role, s in roles.items():
+            assert (s, e) not in problem.unavailable
+            assert role not in qualified or qualified[role][s]
+            if options.one_per_series:
+                assert (s, series_of[i]) not in served
+                served.add((s, series_of[i]))
+
+
+def wait_for(job, states=FINISHED, timeout=120):
+    deadline = time.time() + timeout
+    while job.state not in states:
+        assert time.time() < deadline, 'job %s still %s' % (job.id, job.state)
+        time.sleep(.1)
+
+
+@pytest.fixture(scope='module')
+def problem():
+    return generate_problem(SPEC)
+
+
+'''---------- Solvers ----------'''
+
+
+def test_solve_gives_a_valid_roster(problem):
+    result = solve(problem, OPTIONS, settings=SETTINGS, verbose=False)
+    assert result.status == cp_model.OPTIMAL
+    check_roster(problem, result.roster)
+    assert result.max_duties == max(result.duties.values())
+
+
+def test_greedy_roster_is_valid(problem):
+    roster, empty = greedy_roster(problem, OPTIONS)
+    assert empty == 0
+    check_roster(problem, roster)
+
+
+def test_decomposed_roster_is_valid(problem):
+    result = solve_decomposed(problem, OPTIONS, SETTINGS, rounds=2, processes=1, verbose=False)
+    assert result.has_solution
+    check_roster(problem, result.roster)
+
+
+def test_as_of_keeps_frozen_events(problem):
+    first = solve(problem, OPTIONS, settings=SETTINGS, verbose=False)
+    frozen = freeze_before(problem, first.roster, problem.events[4])
+    assert sorted(frozen.frozen) == sorted(problem.events[:4])
+    result = solve(frozen, OPTIONS, settings=SETTINGS, verbose=False)
+    assert result.has_solution
+    check_roster(frozen, result.roster)
+    for e in problem.events[:4]:
+        assert result.roster[e] == first.roster[e]
+
+
+def test_as_of_after_every_event_is_refused(problem):
+    with pytest.raises(ValueError):
+        freeze_before(problem, {}, '31-Dec')
+
+
+'''---------- Cache ----------'''
+
+
+def test_cache_round_trip(problem, tmp_path):
+    cache = RosterCache(str(tmp_path))
+    first = cache.solve(problem, OPTIONS, SETTINGS, verbose=False)
+    again = cache.solve(problem, OPTIONS, SETTINGS, verbose=False)
+    assert not first.cached and again.cached
+    assert replace(again, cached=False) == first
+    # A model read back from the cache solves to the same objective
+    rebuilt = RosterCache(str(tmp_path)).model(problem, OPTIONS)
+    result = solve(problem, OPTIONS, roster_model=rebuilt, settings=SETTINGS, verbose=False)
+    assert result.objective == first.objective
+
+
+'''---------- Service ----------'''
+
+
+@pytest.fixture(scope='module')
+def service(tmp_path_factory):
+    directory = str(tmp_path_factory.mktemp('club'))
+    write_instance(directory, InstanceSpec(sailors=60, events=100, series=10, seed=1))
+    files = {}
+    for name in (SAILORS, RACE_CALENDAR, UNAVAILABLE_DATES, CREW):
+        with open(os.path.join(directory, name)) as f:
+            files[name] = f.read()
+    service = RosterService(processes=1)
+    service.submit({'club': 'test', 'files': files, 'options': ['--greedy']})
+    yield service
+    service.close()
+
+
+def test_submit_greedy_job(service):
+    job = service.submit({'club': 'test', 'options': ['--greedy', '-add2']})
+    wait_for(job)
+    assert job.state == 'done'
+    check_roster(job.problem, job.result.roster, ModelOptions(one_per_series=True))
+
+
+def test_submit_refuses_bad_requests(service):
+    for request in ({'club': 'unknown'}, {'club': 'test', 'options': ['--cache', 'x']},
+                    {'club': 'test', 'options': ['--help']}, {'club': 'test', 'files': {SAILORS: 1}}):
+        with pytest.raises(RequestError) as error:
+            service.submit(request)
+        assert error.value.code in (400, 404) and str(error.value)
+
+
+def test_cancel_queued_and_running_jobs(service):
+    running = service.submit({'club': 'test', 'options': ['--time-limit', '120', '-add3', '-add4']})
+    queued = service.submit({'club': 'test', 'options': ['--greedy']})
+    wait_for(running, states=('running',))
+    service.cancel(queued.id)
+    start = time.time()
+    service.cancel(running.id)
+    wait_for(running)
+    assert running.state == 'cancelled'
+    assert time.time() - start < 60
+    # A job already handed to the pool runs, but still ends up cancelled
+    wait_for(queued)
+    assert queued.state == 'cancelled'
+
+
+def test_worker_crash_fails_only_the_running_job(service):
+    running = service.submit({'club': 'test', 'options': ['--time-limit', '120', '-add3', '-add4']})
+    queued = service.submit({'club': 'test', 'options': ['--greedy']})
+    wait_for(running, states=('running',))
+    for pid in list(running.pool._processes):
+        os.kill(pid, signal.SIGKILL)
+    wait_for(running)
+    wait_for(queued)
+    assert running.state == 'failed' and 'BrokenProcessPool' in running.error
+    assert queued.state == 'done' and queued.attempts == 2